@@ -1,11 +1,19 @@
 """AI engine module for UIDAI Sentinel fraud detection algorithms"""
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
 import random
+import threading
+import time
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import and_, case, func, select
 from sqlalchemy.orm import Session
 from sklearn.ensemble import IsolationForest
+import geo_index
+import model_registry
 import models
 
 # --- STATE NORMALIZATION MAPPING ---
@@ -135,77 +143,321 @@ STATE_COORDS = {
     "Delhi": [28.7041, 77.1025],
 }
 
-# 3. NATIONAL HOLIDAYS 2025
-HOLIDAYS_2025 = {
-    "2025-01-26": "Republic Day",
-    "2025-03-14": "Holi",
-    "2025-03-31": "Id-ul-Fitr",  # Estimated
-    "2025-04-10": "Mahavir Jayanti",
-    "2025-04-18": "Good Friday",
-    "2025-05-12": "Buddha Purnima",
-    "2025-06-07": "Id-ul-Zuha",  # Estimated
-    "2025-08-15": "Independence Day",
-    "2025-08-16": "Janmashtami",
-    "2025-10-02": "Gandhi Jayanti",
-    "2025-10-20": "Diwali",
-    "2025-11-05": "Guru Nanak Jayanti",
-    "2025-12-25": "Christmas",
-}
+# 3. NATIONAL HOLIDAYS (multi-year calendar, one "date,name" row per holiday)
+HOLIDAY_CALENDAR = os.getenv("HOLIDAY_CALENDAR") or os.path.join(
+    os.path.dirname(__file__), "holidays.csv"
+)
 
 
-def get_coords(state, district, pincode):
+def load_holiday_calendar(path=HOLIDAY_CALENDAR):
+    """Holiday name Series indexed by (normalized) date; empty if the file is missing"""
+    try:
+        calendar = pd.read_csv(path, parse_dates=["date"])
+    except (OSError, ValueError) as e:
+        print(f"⚠ Could not load holiday calendar {path}: {e}")
+        return pd.Series(dtype=object, index=pd.DatetimeIndex([], name="date"))
+    calendar["date"] = calendar["date"].dt.normalize()
+    return calendar.drop_duplicates("date", keep="last").set_index("date")["name"]
+
+
+HOLIDAYS = load_holiday_calendar()
+
+
+INDIA_CENTER = [22.9734, 78.6569]
+
+# Lookup tables built once from the dicts above: name -> (lat, lng, spread)
+_DISTRICT_TABLE = pd.DataFrame(
+    [(lat, lng, 0.05) for lat, lng in DISTRICT_COORDS.values()],  # ~5km
+    index=list(DISTRICT_COORDS),
+    columns=["lat", "lng", "spread"],
+)
+_STATE_TABLE = pd.DataFrame(
+    [(lat, lng, 0.5) for lat, lng in STATE_COORDS.values()],  # ~50km
+    index=list(STATE_COORDS),
+    columns=["lat", "lng", "spread"],
+)
+
+
+def _hash_unit(keys, salt):
+    """Deterministic uniform [0, 1) values per integer key (splitmix64 finalizer)"""
+    with np.errstate(over="ignore"):
+        x = keys.astype(np.uint64) + np.uint64(salt) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def geocode_batch(states, districts, pincodes):
     """
-    Returns high-precision coordinates.
-    Priority: District Match > State Match > India Center
+    Vectorized coordinates for parallel arrays of state/district/pincode.
+    Priority: Pincode Centroid > District Match > State Match > India Center
+    (centroids come from the offline geo_index when it is built), plus a
+    jitter hashed from the pincode (42 when missing), so every point is
+    stable across runs and threads. Returns (lat, lng) float arrays.
     """
-    spread = 0.5  # Default wide spread
-
-    # 1. Try Accurate District Match
-    if district and district in DISTRICT_COORDS:
-        base = DISTRICT_COORDS[district]
-        spread = 0.05  # Very tight spread (~5km) for accuracy
-    # 2. Fallback to State Match
-    elif state and state in STATE_COORDS:
-        base = STATE_COORDS[state]
-        spread = 0.5  # Wider spread (~50km)
-    # 3. Default Fallback
-    else:
-        base = [22.9734, 78.6569]
-        spread = 2.0
+    pins = pd.to_numeric(pd.Series(pincodes, dtype=object), errors="coerce")
+    pins = pins.fillna(42).astype("int64").to_numpy()
+    unique_pins, inverse = np.unique(pins, return_inverse=True)
+
+    # Resolve each distinct (state, district) once, then broadcast to the rows
+    keys = pd.DataFrame(
+        {
+            "state": pd.Series(states, dtype=object),
+            "district": pd.Series(districts, dtype=object),
+        }
+    )
+    codes = keys.groupby(["state", "district"], sort=False, dropna=False).ngroup()
+    places = keys.drop_duplicates()  # same first-seen order as the group codes
+    base = places[["district"]].join(_DISTRICT_TABLE, on="district")
+    base = base[["lat", "lng", "spread"]]
+    index = geo_index.get_index()
+    if index:
+        states = [
+            STATE_NORMALIZATION.get(str(state).strip().lower(), state)
+            for state in places["state"]
+        ]
+        found = index.lookup_districts(states, places["district"])
+        indexed = ~np.isnan(found[:, 0])
+        base.loc[indexed, ["lat", "lng"]] = found[indexed]
+        base.loc[indexed, "spread"] = 0.05
+    by_state = places[["state"]].join(_STATE_TABLE, on="state")
+    base = base.fillna(by_state[["lat", "lng", "spread"]])
+    base = base.fillna({"lat": INDIA_CENTER[0], "lng": INDIA_CENTER[1], "spread": 2.0})
+    base = base.to_numpy()[codes]
+
+    if index:
+        # Known pincodes sit at their own centroid (~1km spread)
+        found = index.lookup_pincodes(unique_pins)[inverse]
+        indexed = ~np.isnan(found[:, 0])
+        base[indexed, :2] = found[indexed]
+        base[indexed, 2] = 0.01
+
+    lat_jitter = (_hash_unit(unique_pins, 1) - 0.5)[inverse]
+    lng_jitter = (_hash_unit(unique_pins, 2) - 0.5)[inverse]
+    return base[:, 0] + lat_jitter * base[:, 2], base[:, 1] + lng_jitter * base[:, 2]
 
-    # Deterministic Jitter using Pincode
-    if pincode:
-        np.random.seed(int(pincode))
-    else:
-        np.random.seed(42)
 
-    lat_offset = (np.random.rand() - 0.5) * spread
-    lng_offset = (np.random.rand() - 0.5) * spread
+def get_coords(state, district, pincode):
+    """Returns high-precision coordinates for one location (see geocode_batch)"""
+    lat, lng = geocode_batch([state], [district], [pincode])
+    return float(lat[0]), float(lng[0])
+
 
-    return base[0] + lat_offset, base[1] + lng_offset
+# --- TYPED LOADING ---
+# Columns that repeat a handful of values across millions of rows
+CATEGORICAL_COLUMNS = ["state", "district"]
+# Counts and pincodes are INTEGER columns, so int32 holds every value;
+# pandas widens group sums to int64 where they would overflow. Columns with
+# NULLs stay float (NaN): missing is not the same as 0 (e.g. "bio < 5")
+METRIC_DTYPE = "int32"
+# Rows converted per batch, bounding the object-string rows held at once
+READ_CHUNK_ROWS = int(os.getenv("READ_CHUNK_ROWS") or "50000")
 
 
-def get_dataframe(db: Session, model_class):
-    """Helper to convert SQL table to Pandas DataFrame"""
-    query = db.query(model_class)
-    conn = db.bind
-    if conn is None:
+def apply_snapshot_dtypes(df):
+    """
+    Casts a raw table frame to compact dtypes: dates -> datetime64,
+    state/district -> categorical, metrics and pincode -> int32
+    (float64 with NaN where the column has NULLs)
+    """
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in df.columns:
+        if col in ("id", "date", *CATEGORICAL_COLUMNS):
+            continue
+        values = pd.to_numeric(df[col])
+        df[col] = values.astype("float64" if values.hasnans else METRIC_DTYPE)
+    return df
+
+
+def concat_typed(frames):
+    """
+    Concatenates typed frames (in place), keeping state/district categorical
+    over the union of their categories; plain pd.concat falls back to object
+    when the categories differ
+    """
+    if len(frames) == 1:
+        return frames[0]
+    for col in CATEGORICAL_COLUMNS:
+        if col in frames[0].columns:
+            for frame in frames:
+                frame[col] = frame[col].astype("category")
+            categories = union_categoricals([frame[col] for frame in frames])
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories.categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_typed_table(engine, model_class, *criteria, columns=None):
+    """
+    Reads a table (optionally filtered by SQLAlchemy criteria) through its own
+    pooled connection, so it is safe to call from any thread. Fetches only
+    `columns` (default: all but id) and casts each chunk to compact dtypes
+    (see apply_snapshot_dtypes) as it streams in, so the untyped rows never
+    exist all at once.
+    """
+    if engine is None:
         raise ValueError("Database connection is not available")
-    return pd.read_sql(query.statement, conn)
+    table = model_class.__table__
+    names = columns or [col.name for col in table.columns if col.name != "id"]
+    statement = select(*(table.c[name] for name in names))
+    if criteria:
+        statement = statement.where(*criteria)
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        chunks = [
+            apply_snapshot_dtypes(chunk)
+            for chunk in pd.read_sql(statement, conn, chunksize=READ_CHUNK_ROWS)
+        ]
+    if not chunks:
+        return apply_snapshot_dtypes(pd.DataFrame(columns=names))
+    return concat_typed(chunks)
+
+
+def get_dataframe(db: Session, model_class, columns=None):
+    """Helper to convert SQL table to a compactly typed Pandas DataFrame"""
+    return read_typed_table(db.bind, model_class, columns=columns)
+
+
+def to_records(frame):
+    """
+    frame as a list of dicts for JSON output, with missing values as None
+    (categorical state/district hold NULLs as NaN, which is truthy)
+    """
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+
+# --- SHARED DATA SNAPSHOT ---
+def _freeze(df):
+    """Marks the frame's numpy buffers read-only so shared views cannot mutate them"""
+    for block in df._mgr.blocks:  # pylint: disable=protected-access
+        if isinstance(block.values, np.ndarray):
+            block.values.setflags(write=False)
+    return df
+
+
+class DataSnapshot:
+    """
+    Loads each raw table at most once per refresh and shares it across detectors.
+
+    Every call to `get` returns a shallow copy over the same (read-only) buffers,
+    so detectors can add their own columns without copying or affecting each other.
+    """
+
+    TABLES = {
+        "enrolment": models.EnrolmentData,
+        "demographic": models.DemographicData,
+        "biometric": models.BiometricData,
+    }
+    # Columns the detectors read, where that is not the whole table (minus id);
+    # enrolment detectors (phantom, bot, sunday) only use adult counts
+    COLUMNS = {
+        "enrolment": ["date", "state", "district", "pincode", "age_18_greater"],
+    }
+
+    def __init__(self, db: Session | None):
+        # Loads go through the pooled engine, never the (non thread-safe) Session
+        self.engine = db.bind if db is not None else None
+        self._frames = {}
+        self._locks = {name: threading.Lock() for name in self.TABLES}
+        self.load_seconds = {}
+
+    def get(self, name):
+        """Returns a read-only view of the named table, loading it on first use"""
+        with self._locks[name]:
+            if name not in self._frames:
+                start_time = time.perf_counter()
+                df = read_typed_table(
+                    self.engine, self.TABLES[name], columns=self.COLUMNS.get(name)
+                )
+                self._frames[name] = _freeze(df)
+                self.load_seconds[name] = time.perf_counter() - start_time
+        return self._frames[name].copy(deep=False)
+
+    def prefetch(self, names):
+        """Loads several tables concurrently (each on its own connection)"""
+        names = [name for name in names if name not in self._frames]
+        if names:
+            with ThreadPoolExecutor(max_workers=len(names)) as executor:
+                list(executor.map(self.get, names))
 
 
 # --- 1. PHANTOM VILLAGE (Fake ID Ring) ---
-def analyze_phantom_village(db: Session):
+PHANTOM_MODEL = "phantom_village"
+PHANTOM_FEATURES = ["age_18_greater"]
+# Rows sampled to fit the model (0 = all rows) and trees fitted in parallel
+PHANTOM_TRAIN_SAMPLES = int(os.getenv("PHANTOM_TRAIN_SAMPLES") or "500000")
+PHANTOM_N_JOBS = int(os.getenv("PHANTOM_N_JOBS") or "-1")
+
+
+def train_phantom_model(df, sample_size=PHANTOM_TRAIN_SAMPLES, n_jobs=PHANTOM_N_JOBS):
+    """Fits the Phantom Village IsolationForest on (a subsample of) enrolment rows"""
+    features = df[PHANTOM_FEATURES].fillna(0)
+    if sample_size and len(features) > sample_size:
+        features = features.sample(n=sample_size, random_state=42)
+    model = IsolationForest(contamination=0.01, random_state=42, n_jobs=n_jobs)
+    return model.fit(features)
+
+
+def retrain_phantom_model(
+    db: Session, sample_size=PHANTOM_TRAIN_SAMPLES, n_jobs=PHANTOM_N_JOBS, force=False
+):
+    """
+    Fits and stores the model for the current enrolment data version.
+    Skipped when that version already has a model (unless force=True).
+    """
+    version = model_registry.data_version(db.bind, models.EnrolmentData)
+    if not force:
+        entry = model_registry.load_model(PHANTOM_MODEL, version)
+        if entry:
+            print(f"[RETRAIN] Model for data version {version} already exists.")
+            return entry
+
+    df = read_typed_table(db.bind, models.EnrolmentData, columns=PHANTOM_FEATURES)
+    model = train_phantom_model(df, sample_size=sample_size, n_jobs=n_jobs)
+    meta = {"rows": len(df), "sample_size": sample_size}
+    return model_registry.save_model(PHANTOM_MODEL, version, model, meta=meta)
+
+
+def get_phantom_model(engine, df):
+    """
+    Stored model for the current data version, else the latest stored one.
+    Only when nothing is stored yet is a model fitted (once) on the spot.
+    """
+    version = None
+    if engine is not None:
+        version = model_registry.data_version(engine, models.EnrolmentData)
+        entry = model_registry.load_model(PHANTOM_MODEL, version)
+        if entry:
+            return entry["model"]
+
+    entry = model_registry.load_model(PHANTOM_MODEL)
+    if entry:
+        return entry["model"]
+
+    print("[PHANTOM] No stored model, fitting one now (see `python tasks.py retrain`)")
+    model = train_phantom_model(df)
+    if version is not None:
+        model_registry.save_model(PHANTOM_MODEL, version, model, meta={"rows": len(df)})
+    return model
+
+
+def analyze_phantom_village(db: Session, snapshot: DataSnapshot | None = None):
     """
     Detects Phantom Village anomalies and Returns CLEANED State-wise data.
     """
-    df = get_dataframe(db, models.EnrolmentData)
+    snapshot = snapshot or DataSnapshot(db)
+    df = snapshot.get("enrolment")
     if df.empty:
         return {"chart_data": [], "map_data": []}
 
-    # 1. Isolation Forest Logic
-    model = IsolationForest(contamination=0.01, random_state=42)
-    df["anomaly"] = model.fit_predict(df[["age_18_greater"]].fillna(0))
+    # 1. Isolation Forest Logic (pre-trained; scoring only)
+    model = get_phantom_model(snapshot.engine, df)
+    df["anomaly"] = model.predict(df[PHANTOM_FEATURES].fillna(0))
 
     # 2. Data Cleaning & Normalization
     # Convert state column to string, strip whitespace, and lower case for matching
@@ -242,9 +494,11 @@ def analyze_phantom_village(db: Session):
         "chart_data": chart_data.to_dict(orient="records"),
         # Map data logic remains the same (using raw names is fine for coordinates lookup)
         "map_data": (
-            df[df["anomaly"] == -1][
-                ["pincode", "district", "state", "age_18_greater", "type"]
-            ].to_dict(orient="records")
+            to_records(
+                df[df["anomaly"] == -1][
+                    ["pincode", "district", "state", "age_18_greater", "type"]
+                ]
+            )
             if "type" in df.columns
             else []
         ),
@@ -252,45 +506,66 @@ def analyze_phantom_village(db: Session):
 
 
 # --- 2. UPDATE MILL (Unauthorized Bulk Ops) ---
-def analyze_update_mill(db: Session):
+def score_update_mill(df):
+    """Adds the per-district z_score of demo_age_17_ (0 where undefined)"""
+    # Built-in (cython) group mean/std broadcast back to the rows
+    groups = df.groupby("district", observed=True)["demo_age_17_"]
+    stats = (df["demo_age_17_"] - groups.transform("mean")) / groups.transform("std")
+    df["z_score"] = stats.fillna(0)
+    return df
+
+
+def top_update_mill(scored, n=20):
+    """Top n distinct (district, z_score) pairs, highest first"""
+    # Only dedupe the highest rows, widening until n distinct pairs are found
+    pairs = scored[["district", "z_score"]]
+    k = n * 4
+    while True:
+        top = pairs.nlargest(k, "z_score", keep="all").drop_duplicates()
+        if len(top) >= n or k >= len(pairs):
+            return top.sort_values("z_score", ascending=False).head(n)
+        k *= 4
+
+
+def update_mill_suspects(scored):
+    """Rows whose z_score crosses the map threshold"""
+    # RELAXED THRESHOLD: Z-Score > 2 (was 3)
+    suspects = scored[scored["z_score"] > 2].copy()
+    suspects["type"] = "Update Mill"
+    suspects["date"] = suspects["date"].dt.strftime("%Y-%m-%d")
+    return suspects[
+        ["pincode", "district", "state", "date", "z_score", "demo_age_17_", "type"]
+    ]
+
+
+def analyze_update_mill(db: Session, snapshot: DataSnapshot | None = None):
     """Detects Update Mill (Unauthorized Bulk Operations)."""
-    df = get_dataframe(db, models.DemographicData)
+    snapshot = snapshot or DataSnapshot(db)
+    df = snapshot.get("demographic")
     if df.empty:
         return {"chart_data": [], "map_data": []}
 
     # Z-Score
-    stats = df.groupby("district")["demo_age_17_"].transform(
-        lambda x: (x - x.mean()) / x.std()
-    )
-    df["z_score"] = stats.fillna(0)
+    df = score_update_mill(df)
 
     # Chart Data
-    top_districts = (
-        df[["district", "z_score"]]
-        .drop_duplicates()
-        .sort_values("z_score", ascending=False)
-        .head(20)
-    )
-    chart_data = top_districts.to_dict(orient="records")
+    chart_data = to_records(top_update_mill(df))
 
-    # Map Data - RELAXED THRESHOLD: Z-Score > 2 (was 3)
-    suspects = df[df["z_score"] > 2].copy()
-    suspects["type"] = "Update Mill"
-    map_data = suspects[
-        ["pincode", "district", "state", "z_score", "demo_age_17_", "type"]
-    ].to_dict(orient="records")
+    # Map Data
+    map_data = to_records(update_mill_suspects(df))
 
     return {"chart_data": chart_data, "map_data": map_data}
 
 
 # --- 3. BIOMETRIC BYPASS (Incomplete Verification) ---
-def analyze_biometric_bypass(db: Session):
+def analyze_biometric_bypass(db: Session, snapshot: DataSnapshot | None = None):
     """
     Detects Biometric Bypass.
     UPDATED: Returns State-wise comparison for Grouped Bar Chart.
     """
-    demo_df = get_dataframe(db, models.DemographicData)
-    bio_df = get_dataframe(db, models.BiometricData)
+    snapshot = snapshot or DataSnapshot(db)
+    demo_df = snapshot.get("demographic")
+    bio_df = snapshot.get("biometric")
     if demo_df.empty or bio_df.empty:
         return {"chart_data": [], "map_data": []}
 
@@ -299,7 +574,9 @@ def analyze_biometric_bypass(db: Session):
     # --- CHART DATA: Aggregated by State ---
     # 1. Group by State and Sum the volumes
     state_stats = (
-        merged.groupby("state")[["demo_age_17_", "bio_age_17_"]].sum().reset_index()
+        merged.groupby("state", observed=True)[["demo_age_17_", "bio_age_17_"]]
+        .sum()
+        .reset_index()
     )
 
     # 2. Calculate Risk Ratio (Demo / Bio) to sort by "Most Suspicious"
@@ -316,19 +593,21 @@ def analyze_biometric_bypass(db: Session):
     merged["risk_score"] = merged["demo_age_17_"] / (merged["bio_age_17_"] + 1)
     high_risk = merged[merged["risk_score"] > 1.5].copy()
     high_risk["type"] = "Biometric Bypass"
+    high_risk["date"] = high_risk["date"].dt.strftime("%Y-%m-%d")
 
-    map_data = high_risk[
-        ["pincode", "district", "state", "risk_score", "type"]
-    ].to_dict(orient="records")
+    map_data = to_records(
+        high_risk[["pincode", "district", "state", "date", "risk_score", "type"]]
+    )
 
     return {"chart_data": chart_data, "map_data": map_data}
 
 
 # --- 4. SCHOLARSHIP GHOST (Child Age/Bio Mismatch) ---
-def analyze_scholarship_ghost(db: Session):
+def analyze_scholarship_ghost(db: Session, snapshot: DataSnapshot | None = None):
     """Detects Scholarship Ghost (Child Age/Bio Mismatch)."""
-    demo_df = get_dataframe(db, models.DemographicData)
-    bio_df = get_dataframe(db, models.BiometricData)
+    snapshot = snapshot or DataSnapshot(db)
+    demo_df = snapshot.get("demographic")
+    bio_df = snapshot.get("biometric")
     if demo_df.empty or bio_df.empty:
         return {"chart_data": [], "map_data": []}
 
@@ -336,7 +615,7 @@ def analyze_scholarship_ghost(db: Session):
 
     # Group stats
     district_stats = (
-        merged.groupby("district")[["demo_age_5_17", "bio_age_5_17"]]
+        merged.groupby("district", observed=True)[["demo_age_5_17", "bio_age_5_17"]]
         .sum()
         .reset_index()
     )
@@ -359,29 +638,90 @@ def analyze_scholarship_ghost(db: Session):
     if len(suspects) > 200:
         suspects = suspects.head(200)
 
-    map_data = suspects[
-        ["pincode", "district", "state", "demo_age_5_17", "bio_age_5_17", "type"]
-    ].to_dict(orient="records")
+    suspects["date"] = suspects["date"].dt.strftime("%Y-%m-%d")
+    map_data = to_records(
+        suspects[
+            [
+                "pincode",
+                "district",
+                "state",
+                "date",
+                "demo_age_5_17",
+                "bio_age_5_17",
+                "type",
+            ]
+        ]
+    )
 
     return {"chart_data": chart_data, "map_data": map_data}
 
 
 # --- 5. BOT OPERATOR (Benford's Law) ---
-def analyze_bot_operator(db: Session):
-    """Detects Bot Operator (Round Numbers)."""
-    df = get_dataframe(db, models.EnrolmentData)
-    if df.empty:
-        return {"chart_data": [], "map_data": []}
+# "sql" aggregates per pincode inside the database, "pandas" on the snapshot
+BOT_OPERATOR_BACKEND = os.getenv("BOT_OPERATOR_BACKEND") or "sql"
 
-    df["is_round"] = df["age_18_greater"].apply(
-        lambda x: 1 if x > 0 and x % 5 == 0 else 0
-    )
+
+def bot_operator_pincode_stats(df):
+    """Per-pincode day count, round count, last date and first-seen state/district"""
+    adults = df["age_18_greater"]
+    df["is_round"] = ((adults > 0) & (adults % 5 == 0)).astype("int64")
 
     pincode_stats = (
         df.groupby("pincode")
-        .agg(total_days=("date", "count"), round_count=("is_round", "sum"))
+        .agg(
+            total_days=("date", "count"),
+            round_count=("is_round", "sum"),
+            last_date=("date", "max"),
+        )
         .reset_index()
     )
+
+    # Merge back state/district info (using first occurrence)
+    meta_df = df[["pincode", "state", "district"]].drop_duplicates("pincode")
+    return pd.merge(pincode_stats, meta_df, on="pincode", how="left")
+
+
+def bot_operator_pincode_stats_sql(engine):
+    """
+    Same per-pincode stats as bot_operator_pincode_stats, computed with one
+    GROUP BY pincode query so only the aggregate rows leave the database.
+    State/district come from each pincode's first row (lowest id).
+    """
+    table = models.EnrolmentData.__table__
+    adults = table.c.age_18_greater
+    per_pincode = (
+        select(
+            table.c.pincode,
+            func.count(table.c.date).label("total_days"),
+            func.sum(case((and_(adults > 0, adults % 5 == 0), 1), else_=0)).label(
+                "round_count"
+            ),
+            func.max(table.c.date).label("last_date"),
+            func.min(table.c.id).label("first_id"),
+        )
+        .where(table.c.pincode.is_not(None))
+        .group_by(table.c.pincode)
+        .subquery()
+    )
+    query = (
+        select(
+            per_pincode.c.pincode,
+            per_pincode.c.total_days,
+            per_pincode.c.round_count,
+            per_pincode.c.last_date,
+            table.c.state,
+            table.c.district,
+        )
+        .join_from(per_pincode, table, table.c.id == per_pincode.c.first_id)
+        .order_by(per_pincode.c.pincode)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, parse_dates=["last_date"])
+
+
+def bot_operator_output(pincode_stats):
+    """Builds chart/map data from per-pincode round-number stats"""
+    pincode_stats = pincode_stats.copy()
     pincode_stats["round_pct"] = (
         pincode_stats["round_count"] / pincode_stats["total_days"]
     ) * 100
@@ -397,93 +737,218 @@ def analyze_bot_operator(db: Session):
     # Map Data
     bots = pincode_stats[pincode_stats["round_pct"] > 80].copy()
     bots["type"] = "Bot Operator"
+    # Latest day seen for the pincode
+    bots["date"] = bots["last_date"].dt.strftime("%Y-%m-%d")
 
-    # Merge back state/district info (using first occurrence)
-    meta_df = df[["pincode", "state", "district"]].drop_duplicates("pincode")
-    bots = pd.merge(bots, meta_df, on="pincode", how="left")
-
-    map_data = bots[["pincode", "district", "state", "type", "round_pct"]].to_dict(
-        orient="records"
+    map_data = to_records(
+        bots[["pincode", "district", "state", "date", "type", "round_pct"]]
     )
 
     return {"chart_data": chart_data, "map_data": map_data}
 
 
-# --- 6. SUNDAY/HOLIDAY SHIFT (UPDATED) ---
-def analyze_sunday_shift(db: Session):
-    """Detects Sunday/Holiday Shift anomalies."""
-    df = get_dataframe(db, models.EnrolmentData)
-    if df.empty:
+def analyze_bot_operator(db: Session, snapshot: DataSnapshot | None = None):
+    """Detects Bot Operator (Round Numbers)."""
+    snapshot = snapshot or DataSnapshot(db)
+    if BOT_OPERATOR_BACKEND == "sql" and snapshot.engine is not None:
+        pincode_stats = bot_operator_pincode_stats_sql(snapshot.engine)
+    else:
+        df = snapshot.get("enrolment")
+        if df.empty:
+            return {"chart_data": [], "map_data": []}
+        pincode_stats = bot_operator_pincode_stats(df)
+
+    if pincode_stats.empty:
         return {"chart_data": [], "map_data": []}
+    return bot_operator_output(pincode_stats)
 
-    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
-    daily_stats = df.groupby("date")["age_18_greater"].sum().reset_index()
 
-    def get_day_type(row):
-        date_str = row["date"].strftime("%Y-%m-%d")
-        if date_str in HOLIDAYS_2025:
-            return "Holiday", HOLIDAYS_2025[date_str]
-        elif row["date"].weekday() == 6:
-            return "Sunday", "Sunday"
-        else:
-            return "Weekday", "Normal"
-
-    daily_stats[["day_type", "label"]] = daily_stats.apply(
-        lambda x: pd.Series(get_day_type(x)), axis=1
+# --- 6. SUNDAY/HOLIDAY SHIFT (UPDATED) ---
+def classify_days(daily_stats):
+    """Adds day_type ("Holiday"/"Sunday"/"Weekday"), label and date_str columns"""
+    dates = daily_stats["date"].dt.normalize()
+    is_holiday = dates.isin(HOLIDAYS.index)
+    is_sunday = dates.dt.dayofweek == 6
+
+    daily_stats["day_type"] = np.select(
+        [is_holiday, is_sunday], ["Holiday", "Sunday"], "Weekday"
+    )
+    daily_stats["label"] = np.select(
+        [is_holiday, is_sunday], [dates.map(HOLIDAYS), "Sunday"], "Normal"
     )
     daily_stats["date_str"] = daily_stats["date"].dt.strftime("%Y-%m-%d")
-    chart_data = daily_stats.sort_values("date")
+    return daily_stats
 
+
+def sunday_shift_suspects(df, daily_stats):
+    """Rows with adult enrolments on the Sunday/Holiday dates of daily_stats"""
     anomaly_dates = daily_stats[daily_stats["day_type"].isin(["Sunday", "Holiday"])][
         "date"
     ]
     suspects = df[(df["date"].isin(anomaly_dates)) & (df["age_18_greater"] > 0)].copy()
     suspects["type"] = "Sunday/Holiday Shift"
+    suspects["date"] = suspects["date"].dt.strftime("%Y-%m-%d")
+    return suspects[["pincode", "district", "state", "date", "age_18_greater", "type"]]
+
+
+def analyze_sunday_shift(db: Session, snapshot: DataSnapshot | None = None):
+    """Detects Sunday/Holiday Shift anomalies."""
+    snapshot = snapshot or DataSnapshot(db)
+    df = snapshot.get("enrolment")
+    if df.empty:
+        return {"chart_data": [], "map_data": []}
 
-    map_data = suspects[
-        ["pincode", "district", "state", "age_18_greater", "type"]
-    ].to_dict(orient="records")
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+    daily_stats = df.groupby("date")["age_18_greater"].sum().reset_index()
+    daily_stats = classify_days(daily_stats)
+    chart_data = daily_stats.sort_values("date")
+
+    map_data = to_records(sunday_shift_suspects(df, daily_stats))
     return {"chart_data": chart_data.to_dict(orient="records"), "map_data": map_data}
 
 
+# --- DETECTOR EXECUTION ---
+# "thread": detectors share the snapshot in-process, each with its own Session
+# "process": detectors run in forked workers that inherit the snapshot copy-on-write
+DETECTOR_EXECUTOR = os.getenv("DETECTOR_EXECUTOR") or "thread"
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS") or "0") or None
+
+# Detector name -> (function, raw tables it reads). Names match tasks.KEYS.
+DETECTORS = {
+    "phantom": (analyze_phantom_village, ["enrolment"]),
+    "update": (analyze_update_mill, ["demographic"]),
+    "bio": (analyze_biometric_bypass, ["demographic", "biometric"]),
+    "ghost": (analyze_scholarship_ghost, ["demographic", "biometric"]),
+    "bot": (
+        analyze_bot_operator,
+        [] if BOT_OPERATOR_BACKEND == "sql" else ["enrolment"],
+    ),
+    "sunday": (analyze_sunday_shift, ["enrolment"]),
+}
+
+# Set in each forked worker by _init_detector_worker
+_WORKER_SNAPSHOT = None
+
+
+def _run_detector_with_session(engine, snapshot, name):
+    """Thread-mode job: runs one detector on a Session of its own"""
+    start_time = time.perf_counter()
+    with Session(engine) as session:
+        result = DETECTORS[name][0](session, snapshot)
+    return result, time.perf_counter() - start_time
+
+
+def _init_detector_worker(snapshot):
+    """Process-mode initializer: keeps the inherited snapshot, drops inherited connections"""
+    global _WORKER_SNAPSHOT  # pylint: disable=global-statement
+    if snapshot.engine is not None:
+        # Pooled connections belong to the parent and must not be reused after fork
+        snapshot.engine.dispose(close=False)
+    _WORKER_SNAPSHOT = snapshot
+
+
+def _run_detector_in_worker(name):
+    """Process-mode job: runs one detector against the inherited snapshot"""
+    start_time = time.perf_counter()
+    result = DETECTORS[name][0](None, _WORKER_SNAPSHOT)
+    return result, time.perf_counter() - start_time
+
+
+def run_detectors(db: Session, names=None, mode=None, max_workers=None):
+    """
+    Runs the named detectors (default: all) over one shared DataSnapshot.
+
+    Returns (results, timings): results maps detector name -> detector output,
+    timings maps detector name (and "load:<table>") -> seconds.
+    """
+    names = list(names or DETECTORS)
+    mode = mode or DETECTOR_EXECUTOR
+    max_workers = (
+        max_workers or DETECTOR_WORKERS or min(len(names), os.cpu_count() or 1)
+    )
+    snapshot = DataSnapshot(db)
+
+    if mode == "process" and "fork" in multiprocessing.get_all_start_methods():
+        # Load the tables up front so the forked workers inherit them. Workers
+        # still query (model versions, the SQL bot-operator backend), on fresh
+        # connections: _init_detector_worker drops the inherited pool
+        snapshot.prefetch({table for name in names for table in DETECTORS[name][1]})
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_detector_worker,
+            initargs=(snapshot,),
+        ) as executor:
+            futures = {
+                name: executor.submit(_run_detector_in_worker, name) for name in names
+            }
+            outcomes = {name: future.result() for name, future in futures.items()}
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(
+                    _run_detector_with_session, snapshot.engine, snapshot, name
+                )
+                for name in names
+            }
+            outcomes = {name: future.result() for name, future in futures.items()}
+
+    results = {name: outcome[0] for name, outcome in outcomes.items()}
+    timings = {name: outcome[1] for name, outcome in outcomes.items()}
+    for table, seconds in snapshot.load_seconds.items():
+        timings[f"load:{table}"] = seconds
+    return results, timings
+
+
+def format_timings(timings):
+    """Formats a timings dict as 'name=1.23s, ...' for log lines"""
+    return ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items())
+
+
 # --- AGGREGATE MAP ENDPOINT ---
-def get_all_map_anomalies(db: Session):
+# Points returned by the legacy (unclustered) map endpoint
+MAP_SAMPLE_SIZE = 1000
+
+
+def collect_map_anomalies(db: Session):
     """
-    Combines map data from all 6 engines.
-    Uses ThreadPoolExecutor for parallel execution.
+    Every map anomaly from all 6 engines, geocoded (no sampling).
+    Detectors run in parallel over a shared DataSnapshot (see run_detectors).
     """
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        phantom_future = executor.submit(analyze_phantom_village, db)
-        update_future = executor.submit(analyze_update_mill, db)
-        bio_future = executor.submit(analyze_biometric_bypass, db)
-        ghost_future = executor.submit(analyze_scholarship_ghost, db)
-        bot_future = executor.submit(analyze_bot_operator, db)
-        sunday_future = executor.submit(analyze_sunday_shift, db)
-
-        # Collect results
-        phantom = phantom_future.result().get("map_data", [])
-        update_mill = update_future.result().get("map_data", [])
-        bio_bypass = bio_future.result().get("map_data", [])
-        ghost = ghost_future.result().get("map_data", [])
-        bot = bot_future.result().get("map_data", [])
-        sunday = sunday_future.result().get("map_data", [])
-
-    all_anomalies = phantom + update_mill + bio_bypass + ghost + bot + sunday
-
-    # Limit for UI performance
-    if len(all_anomalies) > 1000:
-        # Simple sampling to ensure variety
-        random.shuffle(all_anomalies)
-        all_anomalies = all_anomalies[:1000]
-
-    final_data = []
-    for item in all_anomalies:
-        # Use refined get_coords with District priority
-        lat, lng = get_coords(
-            item.get("state"), item.get("district"), item.get("pincode")
-        )
-        item["lat"] = lat
-        item["lng"] = lng
-        final_data.append(item)
+    results, timings = run_detectors(db)
+    print(f"[MAP] Detector timings ({DETECTOR_EXECUTOR}): {format_timings(timings)}")
+    return map_anomalies_from_results(results)
+
+
+def map_anomalies_from_results(results):
+    """Geocoded map anomalies from already computed detector outputs"""
+    all_anomalies = []
+    for name in DETECTORS:
+        all_anomalies += results[name].get("map_data", [])
+
+    # Geocode the full anomaly set in one vectorized pass
+    lat, lng = geocode_batch(
+        [item.get("state") for item in all_anomalies],
+        [item.get("district") for item in all_anomalies],
+        [item.get("pincode") for item in all_anomalies],
+    )
+    for item, item_lat, item_lng in zip(all_anomalies, lat.tolist(), lng.tolist()):
+        item["lat"] = item_lat
+        item["lng"] = item_lng
+    return all_anomalies
+
+
+def sample_map_anomalies(all_anomalies, size=MAP_SAMPLE_SIZE):
+    """Reproducible subset for the unclustered map (same data -> same points)"""
+    if len(all_anomalies) <= size:
+        return all_anomalies
+    # Simple sampling to ensure variety
+    return random.Random(42).sample(all_anomalies, size)
 
-    return final_data
+
+def get_all_map_anomalies(db: Session):
+    """
+    Combines map data from all 6 engines (sampled for UI performance).
+    Use map_index.cluster for full coverage.
+    """
+    return sample_map_anomalies(collect_map_anomalies(db))
@@ -0,0 +1,96 @@
+"""
+Bounded process pool for the API's CPU-bound analytics (detector runs).
+
+Computations run in ANALYTICS_WORKERS separate processes, so pandas/sklearn
+work never holds the API process's GIL, and lightweight routes keep their
+latency. Identical in-flight computations (same key) share one run. Beyond
+ANALYTICS_WORKERS running plus ANALYTICS_QUEUE_LIMIT waiting computations,
+new ones are refused with Overloaded (the API answers 503 + Retry-After).
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from database import SessionLocal
+
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS") or "0") or max(
+    1, (os.cpu_count() or 2) // 2
+)
+ANALYTICS_QUEUE_LIMIT = int(os.getenv("ANALYTICS_QUEUE_LIMIT") or "4")
+# Seconds clients are asked to wait when the pool is full
+ANALYTICS_RETRY_AFTER = int(os.getenv("ANALYTICS_RETRY_AFTER") or "30")
+# "spawn": workers start clean, unaffected by the API's threads and sockets
+ANALYTICS_START_METHOD = os.getenv("ANALYTICS_START_METHOD") or "spawn"
+
+_executor = None
+# key -> future of the computation running for it
+_inflight = {}
+
+
+class Overloaded(Exception):
+    """Raised when the pool has no room for another computation"""
+
+
+def _compute_with_session(compute_func):
+    """Runs in a pool process: compute_func on a Session of its own"""
+    db = SessionLocal()
+    try:
+        return compute_func(db)
+    finally:
+        db.close()
+
+
+def get_executor():
+    """The shared pool, started on first use (and after a broken pool)"""
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=ANALYTICS_WORKERS,
+            mp_context=multiprocessing.get_context(ANALYTICS_START_METHOD),
+        )
+    return _executor
+
+
+def stats():
+    """Current pool usage (for metrics)"""
+    return {
+        "workers": ANALYTICS_WORKERS,
+        "in_flight": len(_inflight),
+        "capacity": ANALYTICS_WORKERS + ANALYTICS_QUEUE_LIMIT,
+    }
+
+
+async def submit(key, compute_func):
+    """
+    Result of compute_func(db) computed in the pool. Joins the computation
+    already running for key, if any; raises Overloaded when the pool is full.
+    compute_func must be a module-level function (it is pickled by name).
+    """
+    global _executor  # pylint: disable=global-statement
+    future = _inflight.get(key)
+    if future is None:
+        if len(_inflight) >= ANALYTICS_WORKERS + ANALYTICS_QUEUE_LIMIT:
+            raise Overloaded(f"{len(_inflight)} analytics computations in flight")
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(
+            get_executor(), _compute_with_session, compute_func
+        )
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    try:
+        # Shielded: a cancelled request must not cancel the shared computation
+        return await asyncio.shield(future)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); start a fresh pool for the next request
+        _executor = None
+        raise
+
+
+def shutdown():
+    """Stops the pool processes (app shutdown)"""
+    global _executor  # pylint: disable=global-statement
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
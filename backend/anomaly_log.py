@@ -0,0 +1,145 @@
+"""
+Materializes detector output into the anomaly_logs alert table.
+
+Every map anomaly becomes one AnomalyLog row keyed by (type, pincode, data_date)
+and is bulk-upserted, so repeated runs refresh severity/evidence in place while
+keeping each alert's investigation status.
+"""
+
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models import AnomalyLog, AnomalyType, SeverityLevel
+from map_index import SCORE_FIELDS
+
+# Detector "type" label -> AnomalyType
+TYPE_MAP = {
+    "Phantom Village": AnomalyType.PHANTOM_VILLAGE,
+    "Update Mill": AnomalyType.UPDATE_MILL,
+    "Biometric Bypass": AnomalyType.BIO_BYPASS,
+    "Scholarship Ghost": AnomalyType.SCHOLARSHIP_GHOST,
+    "Bot Operator": AnomalyType.BOT_OPERATOR,
+    "Sunday/Holiday Shift": AnomalyType.SUNDAY_SHIFT,
+}
+
+# Score at which an alert becomes MEDIUM / HIGH / CRITICAL (below: LOW)
+SEVERITY_THRESHOLDS = {
+    "Phantom Village": (50, 200, 500),
+    "Update Mill": (3, 5, 10),
+    "Biometric Bypass": (3, 10, 50),
+    "Scholarship Ghost": (20, 50, 100),
+    "Bot Operator": (90, 95, 100),
+    "Sunday/Holiday Shift": (10, 50, 200),
+}
+
+KEY_COLUMNS = ["anomaly_type", "pincode", "data_date"]
+LOCATION_FIELDS = {"pincode", "district", "state", "date", "type", "lat", "lng"}
+
+BATCH_SIZE = 5000
+
+
+def severity(anomaly_type, score):
+    """SeverityLevel for one score of the given detector type"""
+    medium, high, critical = SEVERITY_THRESHOLDS[anomaly_type]
+    if score >= critical:
+        return SeverityLevel.CRITICAL
+    if score >= high:
+        return SeverityLevel.HIGH
+    if score >= medium:
+        return SeverityLevel.MEDIUM
+    return SeverityLevel.LOW
+
+
+def alert_rows(anomalies):
+    """
+    AnomalyLog rows for a list of map anomaly dicts, one per
+    (type, pincode, data_date) (the highest-scoring one wins).
+    Anomalies without a known type, pincode or date are skipped.
+    """
+    frame = pd.DataFrame.from_records(anomalies)
+    if frame.empty or not {"type", "pincode", "date"} <= set(frame.columns):
+        return []
+    frame = frame[frame["type"].isin(list(TYPE_MAP))]
+    frame = frame.assign(
+        pincode=pd.to_numeric(frame["pincode"], errors="coerce"),
+        data_date=pd.to_datetime(frame["date"], errors="coerce").dt.date,
+    ).dropna(subset=["pincode", "data_date"])
+
+    frame["score"] = 0.0
+    for anomaly_type, field in SCORE_FIELDS.items():
+        is_type = frame["type"] == anomaly_type
+        if field in frame.columns and is_type.any():
+            frame.loc[is_type, "score"] = pd.to_numeric(
+                frame.loc[is_type, field], errors="coerce"
+            ).fillna(0.0)
+    frame = frame.sort_values("score", ascending=False, kind="stable")
+    frame = frame.drop_duplicates(["type", "pincode", "data_date"])
+
+    evidence_fields = [col for col in frame.columns if col not in LOCATION_FIELDS]
+    evidence_fields.remove("data_date")
+    rows = []
+    for record in frame.to_dict(orient="records"):
+        anomaly_type = record["type"]
+        score_field = SCORE_FIELDS[anomaly_type]
+        district = record.get("district")
+        district = "Unknown" if pd.isna(district) or not district else district
+        state = record.get("state")
+        state = "Unknown" if pd.isna(state) or not state else state
+        rows.append(
+            {
+                "data_date": record["data_date"],
+                "pincode": int(record["pincode"]),
+                "district": str(district),
+                "state": str(state),
+                "anomaly_type": TYPE_MAP[anomaly_type],
+                "severity": severity(anomaly_type, record["score"]),
+                "description": (
+                    f"{anomaly_type} at {district}, {state} ({int(record['pincode'])}): "
+                    f"{score_field} = {record['score']:.2f}"
+                ),
+                "evidence": {
+                    field: record[field]
+                    for field in evidence_fields
+                    if field != "score" and pd.notna(record[field])
+                },
+            }
+        )
+    return rows
+
+
+def ensure_indexes(db: Session):
+    """Creates the upsert key and dashboard indexes on older databases"""
+    for index in AnomalyLog.__table__.indexes:
+        index.create(db.bind, checkfirst=True)
+
+
+def materialize(db: Session, anomalies, batch_size=BATCH_SIZE):
+    """
+    Bulk-upserts map anomalies into anomaly_logs with
+    INSERT ... ON CONFLICT (anomaly_type, pincode, data_date) DO UPDATE.
+    Returns the number of alerts written.
+    """
+    rows = alert_rows(anomalies)
+    if not rows:
+        return 0
+    ensure_indexes(db)
+
+    table = AnomalyLog.__table__
+    for start in range(0, len(rows), batch_size):
+        statement = insert(table).values(rows[start : start + batch_size])
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=KEY_COLUMNS,
+                set_={
+                    "district": statement.excluded.district,
+                    "state": statement.excluded.state,
+                    "severity": statement.excluded.severity,
+                    "description": statement.excluded.description,
+                    "evidence": statement.excluded.evidence,
+                    "detected_at": func.now(),
+                },
+            )
+        )
+    db.commit()
+    return len(rows)
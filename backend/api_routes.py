@@ -1,109 +1,453 @@
 """API routes for UIDAI Sentinel fraud detection analytics"""
 
 import asyncio
-from fastapi import APIRouter, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from database import get_db
+import os
+from datetime import date
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+import redis
 import ai_engine
-from redis_client import get_cached_data, set_cached_data
-from tasks import KEYS
+import analytics_pool
+import cache_codec
+import job_queue
+import map_index
+from local_cache import LocalCache
+from redis_client import (
+    acquire_lock_async,
+    encode_entry,
+    get_cached_blob_async,
+    get_generation_async,
+    is_stale,
+    listen_for_invalidations,
+    release_lock_async,
+    set_cached_blob_async,
+)
+from tasks import KEYS, build_map
 
 router = APIRouter()
 
+# Seconds a cache miss waits for another worker's recomputation before
+# computing on its own
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT") or "60")
+CACHE_POLL_INTERVAL = 0.25
+
+# Where cache misses are computed: "local" (this process) or "queue"
+# (worker.py processes via the Redis job queue; nothing heavy runs here)
+ANALYTICS_COMPUTE = os.getenv("ANALYTICS_COMPUTE") or "local"
+JOB_NAMES = {key: name for name, key in KEYS.items()}
+
+# Cache-Control of cached analytics responses: clients may reuse a response
+# for max-age seconds, then must revalidate it (a cheap 304 when unchanged)
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE") or "30")
+CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate"
+
+# Per-worker cache counters (see /analytics/cache-metrics)
+CACHE_METRICS = {
+    "hit": 0,
+    "local_hit": 0,
+    "miss": 0,
+    "stale": 0,
+    "refresh": 0,
+    "wait": 0,
+    "not_modified": 0,
+    "rejected": 0,
+}
+
+# In-process tier in front of Redis, kept current by the invalidation channel
+LOCAL_CACHE = LocalCache()
+_listener = None
+
+# One asyncio.Lock per cache key: single flight within this worker
+_local_locks = {}
+
+
+def _local_lock(cache_key: str):
+    return _local_locks.setdefault(cache_key, asyncio.Lock())
+
+
+async def start_invalidation_listener():
+    """Subscribes LOCAL_CACHE to cache writes of all processes (app startup)"""
+    global _listener  # pylint: disable=global-statement
+    _listener = asyncio.create_task(
+        listen_for_invalidations(LOCAL_CACHE.invalidate, LOCAL_CACHE.clear)
+    )
+
+
+async def stop_invalidation_listener():
+    """Cancels the subscription (app shutdown)"""
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+
+
+async def get_cached(cache_key: str):
+    """(generation, blob) of key from the local tier, else from Redis"""
+    entry = LOCAL_CACHE.get(cache_key)
+    if entry:
+        CACHE_METRICS["local_hit"] += 1
+        return entry
+    entry = await get_cached_blob_async(cache_key)
+    if entry:
+        LOCAL_CACHE.put(cache_key, *entry)
+    return entry
+
+
+def etag_matches(request: Request, etag: str):
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def cached_response(entry, request: Request):
+    """
+    HTTP response carrying a stored (generation, blob) cache entry.
+    The ETag is the payload's content hash, so polls after a task run that
+    produced identical data still get 304 Not Modified. JSON-serialized
+    values are sent without decoding (still gzipped when the client accepts
+    gzip).
+    """
+    generation, blob = entry
+    # Weak: the gzip and identity representations share it
+    etag = f'W/"{cache_codec.digest(blob)}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        "X-Data-Generation": str(generation),
+    }
+    if etag_matches(request, etag):
+        CACHE_METRICS["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    accept_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    body, content_encoding = cache_codec.json_body(blob, accept_gzip)
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _recompute(cache_key: str, compute_func, is_map: bool):
+    """
+    Recomputes and caches a key under the cross-worker lock.
+    Returns (True, (generation, blob)), or (False, None) if another worker
+    is already on it.
+    """
+    token = await acquire_lock_async(cache_key)
+    if token is None:
+        return False, None
+    try:
+        result = await run_in_pool(cache_key, compute_func)
+        # Extract correct data part
+        data = result if is_map else result.get("chart_data")
+        blob = encode_entry(data)
+        generation = await set_cached_blob_async(cache_key, blob)
+        LOCAL_CACHE.put(cache_key, generation, blob)
+        return True, (generation, blob)
+    finally:
+        await release_lock_async(cache_key, token)
+
+
+async def compute_on_workers(cache_key: str, request: Request):
+    """Queue-mode miss: has a worker compute the key and waits for the result"""
+    try:
+        job = await job_queue.enqueue_async(
+            JOB_NAMES[cache_key], await get_generation_async(cache_key)
+        )
+        status, error = await job_queue.wait_for_job_async(job, CACHE_LOCK_WAIT)
+    except (redis.RedisError, RuntimeError) as e:
+        status, error = "unavailable", str(e)
+    entry = await get_cached(cache_key)
+    if entry:
+        return cached_response(entry, request)
+    raise HTTPException(
+        status_code=503,
+        detail=f"Analytics are being computed ({status}{': ' + error if error else ''})",
+        headers={"Retry-After": str(int(CACHE_LOCK_WAIT))},
+    )
+
+
+async def refresh_in_background(
+    cache_key: str, compute_func, is_map: bool = False, generation: int = 0
+):
+    """Stale-while-revalidate: one refresh per key at a time, across workers"""
+    if ANALYTICS_COMPUTE == "queue":
+        try:
+            await job_queue.enqueue_async(JOB_NAMES[cache_key], generation)
+            CACHE_METRICS["refresh"] += 1
+        except (redis.RedisError, RuntimeError) as e:
+            print(f"Could not queue refresh of {cache_key}: {e}")
+        return
+    lock = _local_lock(cache_key)
+    if lock.locked():
+        return
+    async with lock:
+        try:
+            refreshed, _ = await _recompute(cache_key, compute_func, is_map)
+            if refreshed:
+                CACHE_METRICS["refresh"] += 1
+        except (
+            ValueError,
+            TypeError,
+            KeyError,
+            AttributeError,
+            RuntimeError,
+            HTTPException,
+        ) as e:
+            print(f"Background refresh of {cache_key} failed: {e!r}")
+
 
 async def fetch_or_compute(
     cache_key: str,
     compute_func,
     background_tasks: BackgroundTasks,
-    db: Session,
+    request: Request,
     is_map: bool = False,
 ):
-    """Helper to check cache first, else compute in background"""
+    """
+    Helper to serve from cache first.
+    Stale entries are served as-is while one worker refreshes them in the
+    background; on a miss only one request (per key, across workers)
+    computes and the others wait for its result. Computations run in the
+    bounded analytics pool; when it is full the miss gets 503 + Retry-After.
+    """
     # 1. Try Cache
-    cached = get_cached_data(cache_key)
-    if cached:
-        return cached
+    entry = await get_cached(cache_key)
+    if entry:
+        blob = entry[1]
+        if is_stale(blob):
+            CACHE_METRICS["stale"] += 1
+            background_tasks.add_task(
+                refresh_in_background, cache_key, compute_func, is_map, entry[0]
+            )
+        else:
+            CACHE_METRICS["hit"] += 1
+        return cached_response(entry, request)
+
+    # 2. Cache Miss: Compute immediately (blocking) so this user gets data,
+    # but only once per key: later requests wait for the first one.
+    CACHE_METRICS["miss"] += 1
+    if ANALYTICS_COMPUTE == "queue":
+        return await compute_on_workers(cache_key, request)
+    return await compute_locally(cache_key, compute_func, request, is_map)
+
 
-    # 2. Cache Miss: Compute immediately (blocking) so this user gets data
-    # Alternatively, return empty and let background fill it (non-blocking)
-    # We choose blocking for the first run to ensure data availability.
+async def run_in_pool(key: str, compute_func):
+    """
+    compute_func(db) in the analytics pool; 503 + Retry-After when the pool
+    is full (or its worker died)
+    """
+    try:
+        return await analytics_pool.submit(key, compute_func)
+    except (analytics_pool.Overloaded, BrokenProcessPool) as e:
+        CACHE_METRICS["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail=f"Analytics are busy, retry later ({e})",
+            headers={"Retry-After": str(analytics_pool.ANALYTICS_RETRY_AFTER)},
+        ) from e
+
+
+async def compute_locally(cache_key: str, compute_func, request: Request, is_map):
+    """Local-mode miss: single-flight computation in the analytics pool"""
     loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, compute_func, db)
+    async with _local_lock(cache_key):
+        deadline = loop.time() + CACHE_LOCK_WAIT
+        waited = False
+        while True:
+            entry = await get_cached(cache_key)
+            if entry:
+                return cached_response(entry, request)
+            computed, entry = await _recompute(cache_key, compute_func, is_map)
+            if computed:
+                return cached_response(entry, request)
+            if loop.time() >= deadline:
+                # The other worker is taking too long; compute without the lock
+                # (not cached, but sent through the same codec and headers)
+                result = await run_in_pool(cache_key, compute_func)
+                data = result if is_map else result.get("chart_data")
+                blob = await loop.run_in_executor(None, encode_entry, data)
+                return cached_response((0, blob), request)
+            if not waited:
+                CACHE_METRICS["wait"] += 1
+                waited = True
+            await asyncio.sleep(CACHE_POLL_INTERVAL)
 
-    # Extract correct data part
-    data = result if is_map else result.get("chart_data")
 
-    # 3. Update Cache in Background
-    background_tasks.add_task(set_cached_data, cache_key, data)
+def parse_bbox(bbox: str):
+    """Parses "min_lng,min_lat,max_lng,max_lat" into a tuple of floats"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat"
+        ) from e
+    if min_lng > max_lng or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox min must not exceed max")
+    return min_lng, min_lat, max_lng, max_lat
 
-    return data
+
+async def stored_map_index():
+    """The stored anomaly index (built in the analytics pool if missing)"""
+    loop = asyncio.get_event_loop()
+    index = await loop.run_in_executor(None, map_index.load_map_index)
+    if index is None:
+        await run_in_pool("map_index", build_map)
+        index = await loop.run_in_executor(None, map_index.load_map_index)
+    return index
+
+
+def anomaly_page(index, filters, cursor, limit):
+    """One filtered page from the stored anomaly index"""
+    try:
+        return map_index.query(index, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 @router.get("/analytics/map-all")
 async def get_map_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
+    bbox: str | None = None,
+    zoom: int | None = None,
 ):
-    """Fetch all map anomalies data"""
-    return await fetch_or_compute(
-        KEYS["map"], ai_engine.get_all_map_anomalies, background_tasks, db, is_map=True
+    """
+    Fetch map anomalies data.
+    With bbox (min_lng,min_lat,max_lng,max_lat) and/or zoom: grid clusters
+    covering every anomaly in view, with counts per anomaly type.
+    Without them: the legacy sampled point list.
+    """
+    if bbox is None and zoom is None:
+        return await fetch_or_compute(
+            KEYS["map"],
+            ai_engine.get_all_map_anomalies,
+            background_tasks,
+            request,
+            is_map=True,
+        )
+
+    bounds = parse_bbox(bbox) if bbox else (-180.0, -90.0, 180.0, 90.0)
+    index = await stored_map_index()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, map_index.cluster, index, bounds, 5 if zoom is None else zoom
     )
 
 
+@router.get("/analytics/anomalies")
+async def get_anomalies(
+    anomaly_type: str | None = Query(None, alias="type"),
+    state: str | None = None,
+    district: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    min_score: float | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Paginated, filtered map anomalies (highest score first).
+    Pass the returned next_cursor back as cursor to fetch the next page.
+    """
+    filters = {
+        "type": anomaly_type,
+        "state": state,
+        "district": district,
+        "date_from": date_from,
+        "date_to": date_to,
+        "min_score": min_score,
+    }
+    index = await stored_map_index()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, anomaly_page, index, filters, cursor, limit)
+
+
+@router.get("/analytics/cache-metrics")
+async def get_cache_metrics():
+    """Cache hit/miss/stale counters and analytics pool usage of this API worker"""
+    return {**CACHE_METRICS, "pool": analytics_pool.stats()}
+
+
 @router.get("/analytics/phantom-village")
 async def get_phantom_village_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch phantom village anomaly data"""
     return await fetch_or_compute(
-        KEYS["phantom"], ai_engine.analyze_phantom_village, background_tasks, db
+        KEYS["phantom"],
+        ai_engine.analyze_phantom_village,
+        background_tasks,
+        request,
     )
 
 
 @router.get("/analytics/update-mill")
 async def get_update_mill_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch update mill anomaly data"""
     return await fetch_or_compute(
-        KEYS["update"], ai_engine.analyze_update_mill, background_tasks, db
+        KEYS["update"], ai_engine.analyze_update_mill, background_tasks, request
     )
 
 
 @router.get("/analytics/biometric-bypass")
 async def get_biometric_bypass_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch biometric bypass anomaly data"""
     return await fetch_or_compute(
-        KEYS["bio"], ai_engine.analyze_biometric_bypass, background_tasks, db
+        KEYS["bio"], ai_engine.analyze_biometric_bypass, background_tasks, request
     )
 
 
 @router.get("/analytics/scholarship-ghost")
 async def get_scholarship_ghost_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch scholarship ghost anomaly data"""
     return await fetch_or_compute(
-        KEYS["ghost"], ai_engine.analyze_scholarship_ghost, background_tasks, db
+        KEYS["ghost"],
+        ai_engine.analyze_scholarship_ghost,
+        background_tasks,
+        request,
     )
 
 
 @router.get("/analytics/bot-operator")
 async def get_bot_operator_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch bot operator anomaly data"""
     return await fetch_or_compute(
-        KEYS["bot"], ai_engine.analyze_bot_operator, background_tasks, db
+        KEYS["bot"], ai_engine.analyze_bot_operator, background_tasks, request
     )
 
 
 @router.get("/analytics/sunday-shift")
 async def get_sunday_shift_data(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
     """Fetch sunday shift anomaly data"""
     return await fetch_or_compute(
-        KEYS["sunday"], ai_engine.analyze_sunday_shift, background_tasks, db
+        KEYS["sunday"], ai_engine.analyze_sunday_shift, background_tasks, request
     )
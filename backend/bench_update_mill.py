@@ -0,0 +1,99 @@
+"""
+Benchmark: Update Mill z-scores, per-group Python lambda vs built-in groupby
+aggregations. Checks both produce the same chart/map output on synthetic data.
+Usage: python bench_update_mill.py [--rows 10000000] [--districts 700]
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import ai_engine
+
+
+def make_frame(rows, districts, seed=42):
+    """Synthetic demographic snapshot with the dtypes DataSnapshot produces"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"District {i}" for i in range(districts)])
+    district_idx = rng.integers(0, districts, rows)
+    # Per-district base volume so groups differ in mean and spread
+    base = rng.integers(1, 50, districts)
+    days = pd.date_range("2025-01-01", periods=365)
+    return pd.DataFrame(
+        {
+            "date": days[rng.integers(0, len(days), rows)],
+            "pincode": rng.integers(110001, 855999, rows, dtype="int32"),
+            "district": pd.Categorical(names[district_idx]),
+            "state": pd.Categorical(np.full(rows, "State")),
+            "demo_age_17_": rng.poisson(base[district_idx]).astype("int32"),
+        }
+    )
+
+
+def legacy_score(df):
+    """The original implementation (one Python call per district)"""
+    stats = df.groupby("district", observed=True)["demo_age_17_"].transform(
+        lambda x: (x - x.mean()) / x.std()
+    )
+    df["z_score"] = stats.fillna(0)
+    return df
+
+
+def legacy_top(scored, n=20):
+    return (
+        scored[["district", "z_score"]]
+        .drop_duplicates()
+        .sort_values("z_score", ascending=False)
+        .head(n)
+    )
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update Mill z-score benchmark")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--districts", type=int, default=700)
+    args = parser.parse_args()
+
+    print(f"Building {args.rows:,} rows across {args.districts} districts...")
+    df = make_frame(args.rows, args.districts)
+
+    print("Legacy (transform lambda + full drop_duplicates):")
+    old, old_score = timed("score", legacy_score, df.copy())
+    old_top, old_rank = timed("top 20", legacy_top, old)
+
+    print("Vectorized (groupby mean/std + nlargest):")
+    new, new_score = timed("score", ai_engine.score_update_mill, df.copy())
+    new_top, new_rank = timed("top 20", ai_engine.top_update_mill, new)
+
+    same_scores = np.allclose(old["z_score"], new["z_score"], rtol=1e-9, atol=1e-12)
+    same_top = np.allclose(old_top["z_score"], new_top["z_score"]) and set(
+        old_top["district"]
+    ) == set(new_top["district"])
+    same_suspects = ai_engine.update_mill_suspects(old).index.equals(
+        ai_engine.update_mill_suspects(new).index
+    )
+
+    print("-" * 50)
+    print(f"{'z_score values match':<28} {'✓' if same_scores else '✗'}")
+    print(f"{'top 20 chart matches':<28} {'✓' if same_top else '✗'}")
+    print(f"{'map suspects match':<28} {'✓' if same_suspects else '✗'}")
+    total_old = old_score + old_rank
+    total_new = new_score + new_rank
+    print(
+        f"Total: {total_old:.2f}s -> {total_new:.2f}s "
+        f"({total_old / total_new:.1f}x faster)"
+    )
+    if not (same_scores and same_top and same_suspects):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
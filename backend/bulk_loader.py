@@ -0,0 +1,219 @@
+"""Bulk CSV ingestion primitives: PostgreSQL COPY into a staging table, then one merge"""
+
+import io
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+from models import BiometricData, DemographicData, EnrolmentData
+
+# Rows are uniquely identified by these columns (see the uq_*_loc_date indexes)
+KEY_COLUMNS = ["date", "state", "district", "pincode"]
+
+# Dataset name -> target model, metric columns and default CSV (in backend/)
+TABLE_SPECS = {
+    "enrolment": {
+        "model": EnrolmentData,
+        "metrics": ["age_0_5", "age_5_17", "age_18_greater"],
+        "default_csv": "enrolment_data.csv",
+    },
+    "demographic": {
+        "model": DemographicData,
+        "metrics": ["demo_age_5_17", "demo_age_17_"],
+        "default_csv": "demographic_data.csv",
+    },
+    "biometric": {
+        "model": BiometricData,
+        "metrics": ["bio_age_5_17", "bio_age_17_"],
+        "default_csv": "api_data_aadhar_biometric_0_500000.csv",
+    },
+}
+
+
+def normalize_chunk(df: pd.DataFrame, metrics):
+    """
+    Vectorized cleaning of one CSV chunk.
+    Returns (clean_df, skipped) where skipped counts rows with an unparseable
+    date, pincode or metric. Missing metrics become 0.
+    """
+    out = pd.DataFrame(
+        {
+            "date": pd.to_datetime(df["date"], format="%d-%m-%Y", errors="coerce"),
+            "state": df["state"].astype(str).str.strip(),
+            "district": df["district"].astype(str).str.strip(),
+            "pincode": pd.to_numeric(df["pincode"], errors="coerce"),
+        }
+    )
+    valid = out["date"].notna() & out["pincode"].notna()
+    for col in metrics:
+        values = pd.to_numeric(df[col], errors="coerce")
+        # A value that was present but not numeric invalidates the row
+        valid &= values.notna() | df[col].isna()
+        out[col] = values.fillna(0)
+
+    out = out[valid]
+    out = out.astype({"pincode": "int64", **{col: "int64" for col in metrics}})
+    return out, int((~valid).sum())
+
+
+def create_staging_table(cursor, table_name, metrics):
+    """Creates a transaction-scoped staging table mirroring the target's columns"""
+    staging = sql.Identifier(f"staging_{table_name}")
+    cursor.execute(
+        sql.SQL(
+            "CREATE TEMP TABLE {} (seq bigserial, date date, state text, "
+            "district text, pincode integer, {}) ON COMMIT DROP"
+        ).format(
+            staging,
+            sql.SQL(", ").join(
+                sql.SQL("{} integer").format(sql.Identifier(col)) for col in metrics
+            ),
+        )
+    )
+    return staging
+
+
+def to_copy_payload(dataset: str, chunk: pd.DataFrame):
+    """
+    Validates and normalizes one raw CSV chunk into COPY-ready CSV text.
+    Pure pandas (no DB access), so it can run in a worker process.
+    Returns (payload, skipped).
+    """
+    metrics = TABLE_SPECS[dataset]["metrics"]
+    missing_columns = [col for col in KEY_COLUMNS + metrics if col not in chunk.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns in CSV: {missing_columns}")
+
+    clean, skipped = normalize_chunk(chunk, metrics)
+    payload = clean.to_csv(
+        index=False, header=False, columns=KEY_COLUMNS + metrics, date_format="%Y-%m-%d"
+    )
+    return payload, skipped
+
+
+def copy_chunk(cursor, staging, payload: str, columns):
+    """Streams COPY-ready CSV text into the staging table with COPY ... FROM STDIN"""
+    cursor.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)")
+        .format(staging, sql.SQL(", ").join(map(sql.Identifier, columns)))
+        .as_string(cursor),
+        io.StringIO(payload),
+    )
+
+
+def ensure_merge_key(cursor, table_name):
+    """Creates the unique (date, state, district, pincode) index on older databases"""
+    cursor.execute(
+        sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+            sql.Identifier(f"uq_{table_name}_loc_date"),
+            sql.Identifier(table_name),
+            sql.SQL(", ").join(map(sql.Identifier, KEY_COLUMNS)),
+        )
+    )
+
+
+def merge_staging(cursor, staging, table_name, metrics):
+    """
+    Upserts the staging rows into the target table in one statement.
+    When a key repeats inside the load, the last CSV row wins (as in the old
+    row-by-row scripts). Returns the number of rows inserted or updated.
+    """
+    columns = KEY_COLUMNS + metrics
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    key_list = sql.SQL(", ").join(map(sql.Identifier, KEY_COLUMNS))
+    cursor.execute(
+        sql.SQL(
+            "INSERT INTO {target} ({columns}) "
+            "SELECT DISTINCT ON ({keys}) {columns} FROM {staging} "
+            "ORDER BY {keys}, seq DESC "
+            "ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+        ).format(
+            target=sql.Identifier(table_name),
+            columns=column_list,
+            keys=key_list,
+            staging=staging,
+            updates=sql.SQL(", ").join(
+                sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col))
+                for col in metrics
+            ),
+        )
+    )
+    return cursor.rowcount
+
+
+# Adds partition_changes.xid (see models.PartitionChange) on older databases
+ADD_CHANGE_XID = """
+DO $$ BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'partition_changes' AND column_name = 'xid'
+    ) THEN
+        ALTER TABLE partition_changes
+            ADD COLUMN xid BIGINT DEFAULT (pg_current_xact_id()::text::bigint);
+    END IF;
+END $$
+"""
+
+
+def record_changes(cursor, staging, table_name):
+    """
+    Logs the dates, districts and pincodes this load touched (one row per
+    distinct value) in partition_changes, in the same transaction as the
+    merge, so the incremental detectors only recompute what changed.
+    """
+    cursor.execute(
+        sql.SQL(
+            "INSERT INTO partition_changes (table_name, date, district, pincode) "
+            "SELECT DISTINCT %(table)s, date, NULL::text, NULL::integer FROM {staging} "
+            "WHERE date IS NOT NULL "
+            "UNION ALL "
+            "SELECT DISTINCT %(table)s, NULL::date, district, NULL::integer FROM {staging} "
+            "WHERE district IS NOT NULL "
+            "UNION ALL "
+            "SELECT DISTINCT %(table)s, NULL::date, NULL::text, pincode FROM {staging} "
+            "WHERE pincode IS NOT NULL"
+        ).format(staging=staging),
+        {"table": table_name},
+    )
+
+
+def merge_payload(raw_conn, dataset: str, payload: str):
+    """
+    COPYs a normalized payload into a fresh staging table and merges it.
+    Commits on success, so every chunk is durable on its own.
+    Returns the number of rows inserted or updated.
+    """
+    spec = TABLE_SPECS[dataset]
+    table_name = spec["model"].__tablename__
+    metrics = spec["metrics"]
+
+    cursor = raw_conn.cursor()
+    try:
+        staging = create_staging_table(cursor, table_name, metrics)
+        copy_chunk(cursor, staging, payload, KEY_COLUMNS + metrics)
+        merged = merge_staging(cursor, staging, table_name, metrics)
+        record_changes(cursor, staging, table_name)
+        raw_conn.commit()
+    except psycopg2.Error:
+        raw_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return merged
+
+
+def prepare_table(raw_conn, dataset: str, append_mode: bool = True):
+    """Ensures the merge key exists and, when not appending, clears the table"""
+    spec = TABLE_SPECS[dataset]
+    table_name = spec["model"].__tablename__
+    with raw_conn.cursor() as cursor:
+        ensure_merge_key(cursor, table_name)
+        cursor.execute(ADD_CHANGE_XID)
+        if not append_mode:
+            print(f"Clearing existing {spec['model'].__name__} records...")
+            cursor.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(table_name)))
+            # Tells the incremental detectors to rebuild from scratch
+            cursor.execute(
+                "INSERT INTO partition_changes (table_name) VALUES (%s)",
+                (table_name,),
+            )
+    raw_conn.commit()
@@ -0,0 +1,225 @@
+"""
+Binary format of cached dashboard payloads in Redis.
+
+    header  struct "!2sBBBd8s": magic b"US", format version, serializer id,
+            compression id, fresh_until (epoch seconds, soft TTL),
+            digest (blake2b-64 of the serialized payload; HTTP ETag)
+    body    the serialized payload, compressed
+
+The JSON serializers produce exactly the API response body, so the API can
+send a stored value as-is (gzip passes through with Content-Encoding: gzip;
+other compressions are only decompressed) without decoding it.
+
+Serializers and compressions are registries; orjson, msgpack, zstandard and
+lz4 are used when installed. Pick them with CACHE_SERIALIZER and
+CACHE_COMPRESSION.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import math
+import os
+import struct
+from collections import namedtuple
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b"US"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("!2sBBBd8s")
+# Version 1 had no digest
+HEADERS = {1: struct.Struct("!2sBBBd"), 2: HEADER}
+
+Header = namedtuple(
+    "Header", ["serializer", "compression", "fresh_until", "digest", "size"]
+)
+
+
+def _default(value):
+    """JSON fallback for values the serializers do not know natively"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value):
+    """value with NaN/Infinity floats replaced by None (null), as orjson does"""
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _json_dumps(data):
+    """Strict JSON (non-finite floats become null)"""
+    try:
+        body = json.dumps(
+            data, default=_default, separators=(",", ":"), allow_nan=False
+        )
+    except ValueError:
+        # Rare: only payloads that carry NaN/Infinity pay for the rewrite
+        body = json.dumps(
+            _finite(data), default=_default, separators=(",", ":"), allow_nan=False
+        )
+    return body.encode()
+
+
+# name -> (id, dumps, loads, body is JSON)
+SERIALIZERS = {
+    "json": (1, _json_dumps, json.loads, True),
+}
+if orjson is not None:
+    SERIALIZERS["orjson"] = (
+        2,
+        lambda data: orjson.dumps(
+            data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY
+        ),
+        orjson.loads,
+        True,
+    )
+if msgpack is not None:
+    SERIALIZERS["msgpack"] = (
+        3,
+        lambda data: msgpack.packb(data, default=_default),
+        lambda body: msgpack.unpackb(body, raw=False),
+        False,
+    )
+
+# name -> (id, compress, decompress, HTTP Content-Encoding or None)
+COMPRESSIONS = {
+    "none": (0, bytes, bytes, None),
+    "gzip": (
+        1,
+        # mtime=0: identical payloads give identical bytes
+        lambda body: gzip.compress(body, compresslevel=6, mtime=0),
+        gzip.decompress,
+        "gzip",
+    ),
+}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (
+        2,
+        lambda body: zstandard.ZstdCompressor(level=3).compress(body),
+        lambda body: zstandard.ZstdDecompressor().decompress(body),
+        None,
+    )
+if lz4 is not None:
+    COMPRESSIONS["lz4"] = (3, lz4.frame.compress, lz4.frame.decompress, None)
+
+_SERIALIZER_IDS = {spec[0]: name for name, spec in SERIALIZERS.items()}
+_COMPRESSION_IDS = {spec[0]: name for name, spec in COMPRESSIONS.items()}
+
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER") or (
+    "orjson" if orjson is not None else "json"
+)
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION") or "gzip"
+if CACHE_SERIALIZER not in SERIALIZERS:
+    print(f"⚠ Cache serializer {CACHE_SERIALIZER!r} unavailable; using json")
+    CACHE_SERIALIZER = "json"
+if CACHE_COMPRESSION not in COMPRESSIONS:
+    print(f"⚠ Cache compression {CACHE_COMPRESSION!r} unavailable; using gzip")
+    CACHE_COMPRESSION = "gzip"
+
+
+def encode(data, fresh_until, serializer=None, compression=None):
+    """Header + compressed serialized data"""
+    serializer = serializer or CACHE_SERIALIZER
+    compression = compression or CACHE_COMPRESSION
+    serializer_id, dumps, _, _ = SERIALIZERS[serializer]
+    compression_id, compress, _, _ = COMPRESSIONS[compression]
+    body = dumps(data)
+    digest = hashlib.blake2b(body, digest_size=8).digest()
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, serializer_id, compression_id, fresh_until, digest
+    )
+    return header + compress(body)
+
+
+def read_header(blob):
+    """
+    Header of an encoded value, or None for a value stored as plain JSON
+    text. ValueError for unknown versions / codecs.
+    """
+    if not blob.startswith(MAGIC) or len(blob) < len(MAGIC) + 1:
+        return None
+    version = blob[len(MAGIC)]
+    if version not in HEADERS or len(blob) < HEADERS[version].size:
+        raise ValueError(f"Unsupported cache format version {version}")
+    layout = HEADERS[version]
+    fields = layout.unpack_from(blob)
+    serializer_id, compression_id, fresh_until = fields[2:5]
+    if version == 1:
+        digest = hashlib.blake2b(blob[layout.size :], digest_size=8).digest()
+    else:
+        digest = fields[5]
+    try:
+        return Header(
+            _SERIALIZER_IDS[serializer_id],
+            _COMPRESSION_IDS[compression_id],
+            fresh_until,
+            digest,
+            layout.size,
+        )
+    except KeyError as e:
+        raise ValueError(f"Cache codec {e} not available") from e
+
+
+def decode(blob):
+    """(data, fresh_until) of a stored value; fresh_until None if unknown"""
+    header = read_header(blob)
+    if header is None:
+        value = json.loads(blob)
+        if isinstance(value, dict) and set(value) == {"fresh_until", "data"}:
+            return value["data"], value["fresh_until"]
+        return value, None
+    body = COMPRESSIONS[header.compression][2](blob[header.size :])
+    return SERIALIZERS[header.serializer][2](body), header.fresh_until
+
+
+def json_body(blob, accept_gzip=False):
+    """
+    (bytes, Content-Encoding) for answering an HTTP request with a stored
+    value, without decoding it where the stored format allows.
+    """
+    header = read_header(blob)
+    if header is None:
+        value, _ = decode(blob)
+        return _json_dumps(value), None
+    _, _, decompress, content_encoding = COMPRESSIONS[header.compression]
+    body = blob[header.size :]
+    if not SERIALIZERS[header.serializer][3]:
+        return _json_dumps(SERIALIZERS[header.serializer][2](decompress(body))), None
+    if content_encoding and accept_gzip:
+        return body, content_encoding
+    return decompress(body), None
+
+
+def digest(blob):
+    """Hex content hash of a stored value's payload"""
+    header = read_header(blob)
+    if header is None:
+        return hashlib.blake2b(blob, digest_size=8).hexdigest()
+    return header.digest.hex()
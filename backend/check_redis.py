@@ -34,12 +34,12 @@ try:
     else:
         print(f"✅ Found {len(keys)} cached items:")
         print("-" * 50)
-        print(f"{'KEY':<30} | {'TTL (sec)':<10} | {'SIZE (chars)':<10}")
+        print(f"{'KEY':<30} | {'TTL (sec)':<10} | {'SIZE (bytes)':<10}")
         print("-" * 50)
         for key in keys:
             ttl = r.ttl(key)
-            val = r.get(key)
-            SIZE = len(str(val)) if val else 0
+            # Values are binary (see cache_codec), so size them server-side
+            SIZE = r.strlen(key)
             print(f"{key:<30} | {ttl:<10} | {SIZE:<10}")
         print("-" * 50)
 
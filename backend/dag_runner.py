@@ -0,0 +1,230 @@
+"""
+Dependency-aware parallel job runner (used by `python tasks.py all`).
+
+Every attempt of a job runs in a forked child process, as soon as the jobs
+it depends on have succeeded and a worker slot is free. The child receives
+the results of those dependencies and sends its own result back over a
+pipe. An attempt that exceeds the job's timeout is terminated; failed or
+timed out attempts are retried up to the job's retry count, and jobs whose
+dependencies failed are skipped.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from multiprocessing.connection import wait
+from sqlalchemy.exc import SQLAlchemyError
+
+# func(dep_results) -> result; deps must succeed first, after only orders
+Job = namedtuple(
+    "Job", ["func", "deps", "after", "timeout", "retries"], defaults=[(), 3600, 1]
+)
+
+Outcome = namedtuple("Outcome", ["status", "attempts", "seconds", "result", "error"])
+
+# Errors a job reports as a failed attempt (anything else kills the child,
+# which counts the same)
+JOB_ERRORS = (
+    ValueError,
+    TypeError,
+    KeyError,
+    AttributeError,
+    RuntimeError,
+    OSError,
+    SQLAlchemyError,
+)
+
+
+def _run_child(conn, func, dep_results, initializer):
+    """Forked child: runs one attempt and sends ("ok", result) or ("error", msg)"""
+    try:
+        if initializer is not None:
+            initializer()
+        result = func(dep_results)
+        conn.send(("ok", result))
+    except JOB_ERRORS as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _order(jobs, names, done=()):
+    """
+    names plus everything they depend on (except jobs in done), validated
+    and in graph order
+    """
+    ordered, visiting = [], set()
+
+    def visit(name):
+        if name in ordered or (name in done and name not in names):
+            return
+        if name not in jobs:
+            raise ValueError(f"Unknown job {name!r}")
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name!r}")
+        visiting.add(name)
+        for dep in jobs[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def run_graph(
+    jobs,
+    names=None,
+    max_workers=None,
+    initializer=None,
+    on_success=None,
+    log=print,
+    results=None,
+):
+    """
+    Runs the named jobs (default: all) and their dependencies.
+
+    jobs maps name -> Job. initializer() runs first in every child (e.g. to
+    drop inherited DB connections); on_success(name, result) runs in this
+    process as each job finishes. results maps job name -> a result kept
+    from an earlier run; such jobs satisfy dependencies without running
+    again (unless named). Returns {name: Outcome} in graph order.
+    """
+    results = results or {}
+    selected = _order(jobs, list(names or jobs), results)
+    max_workers = max_workers or os.cpu_count() or 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        # Jobs and their results are handed to children by fork, not pickling
+        max_workers = 0
+    context = multiprocessing.get_context("fork") if max_workers else None
+
+    pending = list(selected)
+    running = {}  # pipe -> (name, process, started_at, deadline)
+    attempts = {name: 0 for name in selected}
+    started = {}
+    outcomes = {}
+
+    def finish(name, status, result=None, error=None):
+        outcomes[name] = Outcome(
+            status,
+            attempts[name],
+            time.perf_counter() - started[name] if name in started else 0.0,
+            result,
+            error,
+        )
+        if status == "ok":
+            log(f"[{name.upper()}] ✓ Completed in {outcomes[name].seconds:.2f}s")
+            if on_success is not None:
+                on_success(name, result)
+        else:
+            log(f"[{name.upper()}] ✗ {status}: {error}")
+
+    def attempt_failed(name, error):
+        if attempts[name] <= jobs[name].retries:
+            log(
+                f"[{name.upper()}] ⚠ Attempt {attempts[name]} failed ({error}); retrying"
+            )
+            pending.insert(0, name)
+        else:
+            finish(name, "failed", error=error)
+
+    def start(name):
+        attempts[name] += 1
+        started.setdefault(name, time.perf_counter())
+        job = jobs[name]
+        dep_results = {
+            dep: outcomes[dep].result if dep in outcomes else results[dep]
+            for dep in job.deps
+        }
+        if not max_workers:
+            try:
+                finish(name, "ok", result=job.func(dep_results))
+            except JOB_ERRORS as e:
+                attempt_failed(name, f"{type(e).__name__}: {e}")
+            return
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_child,
+            args=(sender, job.func, dep_results, initializer),
+            name=f"job-{name}",
+        )
+        process.start()
+        sender.close()
+        now = time.monotonic()
+        running[receiver] = (name, process, now, now + job.timeout)
+
+    while pending or running:
+        # Settle jobs whose dependencies can no longer succeed
+        for name in list(pending):
+            failed = [
+                dep
+                for dep in jobs[name].deps
+                if dep in outcomes and outcomes[dep].status != "ok"
+            ]
+            if failed:
+                pending.remove(name)
+                finish(name, "skipped", error=f"dependency {failed[0]} did not succeed")
+
+        progressed = False
+        for name in list(pending):
+            if max_workers and len(running) >= max_workers:
+                break
+            job = jobs[name]
+            waiting_on = [
+                dep
+                for dep in (*job.deps, *job.after)
+                if dep in attempts and dep not in outcomes
+            ]
+            if not waiting_on:
+                pending.remove(name)
+                start(name)
+                progressed = True
+
+        if not running:
+            if pending and not progressed:
+                raise RuntimeError(f"Ordering cycle between jobs {pending}")
+            continue
+
+        now = time.monotonic()
+        timeout = max(0.0, min(entry[3] for entry in running.values()) - now)
+        for receiver in wait(list(running), timeout=timeout):
+            name, process, _, _ = running.pop(receiver)
+            try:
+                status, payload = receiver.recv()
+            except EOFError:
+                status, payload = "error", None
+            receiver.close()
+            process.join()
+            if status == "ok":
+                finish(name, "ok", result=payload)
+            else:
+                attempt_failed(
+                    name, payload or f"worker exited with code {process.exitcode}"
+                )
+
+        now = time.monotonic()
+        for receiver, (name, process, attempt_start, deadline) in list(running.items()):
+            if now >= deadline:
+                running.pop(receiver)
+                process.terminate()
+                process.join()
+                receiver.close()
+                attempt_failed(name, f"timed out after {now - attempt_start:.0f}s")
+
+    return {name: outcomes[name] for name in selected}
+
+
+def format_summary(outcomes):
+    """Fixed-width summary table of run_graph outcomes"""
+    lines = [
+        f"{'JOB':<10} | {'STATUS':<8} | {'TRIES':>5} | {'TIME (s)':>8} | ERROR",
+        "-" * 60,
+    ]
+    for name, outcome in outcomes.items():
+        lines.append(
+            f"{name:<10} | {outcome.status:<8} | {outcome.attempts:>5} | "
+            f"{outcome.seconds:>8.2f} | {outcome.error or ''}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,175 @@
+"""
+Offline pincode / district centroid index for map geolocation.
+
+Built once from a local copy of the India Post pincode directory CSV
+(columns: pincode, district, statename, latitude, longitude):
+
+    python geo_index.py path/to/pincode_directory.csv
+
+This writes to GEO_INDEX_DIR:
+    pincode_centroids.npy   float32 (900000, 2) lat/lng, row = pincode - 100000
+    district_centroids.npy  float32 (k, 2) lat/lng
+    district_keys.json      ["state|district", ...] rows of district_centroids
+
+The .npy files are memory-mapped read-only, so lookups are O(1) array
+indexing and the pages are shared by every worker process.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+GEO_INDEX_DIR = os.getenv("GEO_INDEX_DIR") or os.path.join(
+    os.path.dirname(__file__), ".geo"
+)
+
+PINCODE_MIN = 100000
+PINCODE_MAX = 999999
+
+# Rough bounding box of India, used to drop bad source coordinates
+LAT_RANGE = (6.0, 38.0)
+LNG_RANGE = (68.0, 98.0)
+
+# Seconds before a missing/unreadable index is looked for again
+GEO_INDEX_RETRY = float(os.getenv("GEO_INDEX_RETRY") or "60")
+
+_index = None
+_index_failed_at = None
+_index_lock = threading.Lock()
+
+
+def district_key(state, district):
+    """Normalized lookup key for a (state, district) pair"""
+    return f"{str(state).strip().lower()}|{str(district).strip().lower()}"
+
+
+class GeoIndex:
+    """Read-only centroid lookups backed by memory-mapped arrays"""
+
+    def __init__(self, path=GEO_INDEX_DIR):
+        self.pincodes = np.load(
+            os.path.join(path, "pincode_centroids.npy"), mmap_mode="r"
+        )
+        self.districts = np.load(
+            os.path.join(path, "district_centroids.npy"), mmap_mode="r"
+        )
+        with open(os.path.join(path, "district_keys.json"), encoding="utf-8") as f:
+            self.district_rows = {key: row for row, key in enumerate(json.load(f))}
+
+    def lookup_pincodes(self, pincodes):
+        """(n, 2) lat/lng array for integer pincodes, NaN where unknown"""
+        pincodes = np.asarray(pincodes, dtype=np.int64)
+        coords = np.full((len(pincodes), 2), np.nan)
+        valid = (pincodes >= PINCODE_MIN) & (pincodes <= PINCODE_MAX)
+        coords[valid] = self.pincodes[pincodes[valid] - PINCODE_MIN]
+        return coords
+
+    def lookup_districts(self, states, districts):
+        """(n, 2) lat/lng array for (state, district) pairs, NaN where unknown"""
+        rows = np.array(
+            [
+                self.district_rows.get(district_key(state, district), -1)
+                for state, district in zip(states, districts)
+            ],
+            dtype=np.int64,
+        )
+        coords = np.full((len(rows), 2), np.nan)
+        found = rows >= 0
+        coords[found] = self.districts[rows[found]]
+        return coords
+
+
+def get_index():
+    """
+    The shared GeoIndex, or None when it has not been built
+    (retried every GEO_INDEX_RETRY seconds, so an index built later is picked up)
+    """
+    global _index, _index_failed_at  # pylint: disable=global-statement
+    with _index_lock:
+        if _index is None and (
+            _index_failed_at is None
+            or time.monotonic() - _index_failed_at >= GEO_INDEX_RETRY
+        ):
+            try:
+                _index = GeoIndex(GEO_INDEX_DIR)
+                if _index_failed_at is not None:
+                    print("✓ Geo index loaded")
+            except (OSError, ValueError) as e:
+                if _index_failed_at is None:
+                    print(f"⚠ Geo index unavailable ({e}); using built-in coordinates")
+                _index_failed_at = time.monotonic()
+        return _index
+
+
+def build_index(csv_path, path=GEO_INDEX_DIR):
+    """Aggregates a pincode directory CSV into centroid arrays under path"""
+    source = pd.read_csv(
+        csv_path,
+        usecols=lambda col: col.lower()
+        in {"pincode", "district", "statename", "state", "latitude", "longitude"},
+        dtype=str,
+    )
+    source.columns = [col.lower() for col in source.columns]
+    if "statename" in source.columns:
+        source = source.rename(columns={"statename": "state"})
+
+    points = pd.DataFrame(
+        {
+            "pincode": pd.to_numeric(source["pincode"], errors="coerce"),
+            "state": source["state"],
+            "district": source["district"],
+            "lat": pd.to_numeric(source["latitude"], errors="coerce"),
+            "lng": pd.to_numeric(source["longitude"], errors="coerce"),
+        }
+    )
+    valid = (
+        points["pincode"].between(PINCODE_MIN, PINCODE_MAX)
+        & points["lat"].between(*LAT_RANGE)
+        & points["lng"].between(*LNG_RANGE)
+    )
+    points = points[valid].astype({"pincode": "int64"})
+
+    pincode_centroids = np.full((PINCODE_MAX - PINCODE_MIN + 1, 2), np.nan, np.float32)
+    per_pincode = points.groupby("pincode")[["lat", "lng"]].mean()
+    pincode_centroids[per_pincode.index.to_numpy() - PINCODE_MIN] = (
+        per_pincode.to_numpy()
+    )
+
+    points["key"] = [
+        district_key(state, district)
+        for state, district in zip(points["state"], points["district"])
+    ]
+    per_district = points.groupby("key")[["lat", "lng"]].mean()
+
+    os.makedirs(path, exist_ok=True)
+    for name, array in (
+        ("pincode_centroids.npy", pincode_centroids),
+        ("district_centroids.npy", per_district.to_numpy(np.float32)),
+    ):
+        tmp_path = os.path.join(path, f"{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(path, name))
+    tmp_path = os.path.join(path, "district_keys.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(list(per_district.index), f)
+    os.replace(tmp_path, os.path.join(path, "district_keys.json"))
+
+    print(
+        f"✓ Geo index built in {path}: {len(per_pincode)} pincodes, "
+        f"{len(per_district)} districts (skipped {int((~valid).sum())} source rows)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the offline pincode/district centroid index."
+    )
+    parser.add_argument("csv", help="India Post pincode directory CSV")
+    parser.add_argument("--out", default=GEO_INDEX_DIR, help="Output directory.")
+    args = parser.parse_args()
+    build_index(args.csv, args.out)
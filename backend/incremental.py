@@ -0,0 +1,244 @@
+"""
+Incremental refresh for detectors whose state splits cleanly by partition:
+    Update Mill   -> per district (top z-scores, suspects)
+    Bot Operator  -> per pincode  (day count, round-number count)
+    Sunday Shift  -> per date     (daily totals, suspects on Sundays/holidays)
+
+Each detector keeps its aggregates on disk (AGGREGATE_DIR) with the database
+snapshot (pg_current_snapshot) they reflect. A refresh reads only the
+partition_changes committed since that snapshot, re-reads the rows of the
+affected partitions and replaces just those groups. Changes are matched by
+their inserting transaction rather than by id: ids are assigned before
+commit, so concurrent loads can commit a lower id after a higher one.
+The first run (or a table reload) does a full build.
+"""
+
+import os
+import joblib
+import pandas as pd
+from sqlalchemy import and_, delete, func, select, text
+from sqlalchemy.orm import Session
+import ai_engine
+import bulk_loader
+import models
+
+AGGREGATE_DIR = os.getenv("AGGREGATE_DIR") or os.path.join(
+    os.path.dirname(__file__), ".aggregates"
+)
+
+# Aggregate name -> (raw model, partition column)
+CONSUMERS = {
+    "update_mill": (models.DemographicData, "district"),
+    "bot_operator": (models.EnrolmentData, "pincode"),
+    "sunday_shift": (models.EnrolmentData, "date"),
+}
+
+
+def _state_path(name):
+    return os.path.join(AGGREGATE_DIR, f"{name}.joblib")
+
+
+def load_state(name):
+    """Returns the saved {"snapshot", "parts"} state, or None"""
+    path = _state_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"⚠ Ignoring unreadable aggregate {path}: {e}")
+        return None
+
+
+def save_state(name, state):
+    """Atomically replaces the saved state"""
+    os.makedirs(AGGREGATE_DIR, exist_ok=True)
+    path = _state_path(name)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def latest_change_id(db: Session, table_name):
+    """Highest partition_changes id recorded for a table (0 if none)"""
+    change = models.PartitionChange
+    return (
+        db.execute(
+            select(func.max(change.id)).where(change.table_name == table_name)
+        ).scalar()
+        or 0
+    )
+
+
+def current_snapshot(db: Session):
+    """Text form of the transaction snapshot: which transactions have committed"""
+    return db.execute(text("SELECT pg_current_snapshot()::text")).scalar()
+
+
+def _visible_in(snapshot, param, visible=True):
+    """Condition: the change's transaction had (not) committed as of snapshot"""
+    return text(
+        f"{'' if visible else 'NOT '}"
+        f"pg_visible_in_snapshot(xid::text::xid8, CAST(:{param} AS pg_snapshot))"
+    ).bindparams(**{param: snapshot})
+
+
+def changed_partitions(db: Session, table_name, column, after_snapshot, snapshot):
+    """
+    Distinct values of `column` changed by transactions committed after
+    after_snapshot, as of snapshot.
+    Returns None when the table was reloaded and everything must be rebuilt.
+    """
+    change = models.PartitionChange
+    rows = db.execute(
+        select(change.date, change.district, change.pincode)
+        .where(
+            change.table_name == table_name,
+            _visible_in(snapshot, "snapshot"),
+            _visible_in(after_snapshot, "after_snapshot", visible=False),
+        )
+        .distinct()
+    ).all()
+    values = set()
+    for row in rows:
+        if row.date is None and row.district is None and row.pincode is None:
+            return None
+        values.add(getattr(row, column))
+    values.discard(None)
+    return sorted(values)
+
+
+def prune_changes(db: Session):
+    """
+    Deletes change records every consumer of a table has already folded in.
+    The newest record is kept so change ids stay monotonic.
+    """
+    snapshots = {}
+    for name, (model_class, _) in CONSUMERS.items():
+        state = load_state(name)
+        snapshot = state.get("snapshot") if state else None
+        snapshots.setdefault(model_class.__tablename__, []).append(snapshot)
+
+    change = models.PartitionChange
+    for table_name, table_snapshots in snapshots.items():
+        if None in table_snapshots:
+            continue
+        db.execute(
+            delete(change).where(
+                change.table_name == table_name,
+                change.id < latest_change_id(db, table_name),
+                and_(
+                    *(
+                        _visible_in(snapshot, f"snapshot_{i}")
+                        for i, snapshot in enumerate(table_snapshots)
+                    )
+                ),
+            )
+        )
+    db.commit()
+
+
+def refresh(db: Session, name, compute):
+    """
+    Brings the named aggregate up to date and returns its parts.
+
+    compute(rows) must return a dict of DataFrames that each carry the
+    partition column, covering exactly the partitions present in `rows`.
+    """
+    model_class, column = CONSUMERS[name]
+    table_name = model_class.__tablename__
+    db.execute(text(bulk_loader.ADD_CHANGE_XID))
+    db.commit()
+    state = load_state(name)
+    # Taken before reading rows, so anything committed later is seen again
+    # next time (recomputing a partition twice is harmless)
+    snapshot = current_snapshot(db)
+
+    changed = None
+    if state is not None and "snapshot" in state:
+        changed = changed_partitions(
+            db, table_name, column, state["snapshot"], snapshot
+        )
+
+    if changed is None:
+        print(f"[{name.upper()}] Full build")
+        parts = compute(ai_engine.read_typed_table(db.bind, model_class))
+    elif not changed:
+        print(f"[{name.upper()}] No changed partitions")
+        parts = state["parts"]
+    else:
+        print(
+            f"[{name.upper()}] Recomputing {len(changed)} changed {column} partitions"
+        )
+        rows = ai_engine.read_typed_table(
+            db.bind, model_class, getattr(model_class, column).in_(changed)
+        )
+        fresh = compute(rows)
+        stale = pd.to_datetime(changed) if column == "date" else changed
+        parts = {}
+        for key, frame in state["parts"].items():
+            values = frame[column]
+            if column == "date":
+                # Map records carry dates as "YYYY-MM-DD" strings
+                values = pd.to_datetime(values)
+            keep = frame[~values.isin(stale)].copy()
+            parts[key] = ai_engine.concat_typed([keep, fresh[key]])
+
+    save_state(name, {"snapshot": snapshot, "parts": parts})
+    prune_changes(db)
+    return parts
+
+
+# --- UPDATE MILL: per-district top z-scores and suspects ---
+def _compute_update_mill(rows):
+    scored = ai_engine.score_update_mill(rows)
+    # Each district's own top 20 is enough to rebuild the global top 20
+    top = (
+        scored[["district", "z_score"]]
+        .drop_duplicates()
+        .sort_values("z_score", ascending=False)
+        .groupby("district", observed=True)
+        .head(20)
+    )
+    return {
+        "top": top,
+        "suspects": ai_engine.update_mill_suspects(scored),
+    }
+
+
+def refresh_update_mill(db: Session):
+    """Incremental equivalent of ai_engine.analyze_update_mill"""
+    parts = refresh(db, "update_mill", _compute_update_mill)
+    return {
+        "chart_data": ai_engine.to_records(ai_engine.top_update_mill(parts["top"])),
+        "map_data": ai_engine.to_records(parts["suspects"]),
+    }
+
+
+# --- BOT OPERATOR: per-pincode round counts ---
+def _compute_bot_operator(rows):
+    return {"pincodes": ai_engine.bot_operator_pincode_stats(rows)}
+
+
+def refresh_bot_operator(db: Session):
+    """Incremental equivalent of ai_engine.analyze_bot_operator"""
+    parts = refresh(db, "bot_operator", _compute_bot_operator)
+    return ai_engine.bot_operator_output(parts["pincodes"])
+
+
+# --- SUNDAY SHIFT: daily totals ---
+def _compute_sunday_shift(rows):
+    daily = rows.groupby("date")["age_18_greater"].sum().reset_index()
+    suspects = ai_engine.sunday_shift_suspects(rows, ai_engine.classify_days(daily))
+    return {"daily": daily[["date", "age_18_greater"]], "suspects": suspects}
+
+
+def refresh_sunday_shift(db: Session):
+    """Incremental equivalent of ai_engine.analyze_sunday_shift"""
+    parts = refresh(db, "sunday_shift", _compute_sunday_shift)
+    daily_stats = ai_engine.classify_days(parts["daily"].copy())
+    chart_data = daily_stats.sort_values("date")
+    return {
+        "chart_data": chart_data.to_dict(orient="records"),
+        "map_data": ai_engine.to_records(parts["suspects"]),
+    }
@@ -0,0 +1,408 @@
+"""
+Unified CSV ingestion for the raw UIDAI tables (replaces the per-table scripts).
+Usage:
+    python ingest.py enrolment path/to/enrolment.csv
+    python ingest.py demographic path/to/demographic.csv --chunk-rows 100000
+    python ingest.py biometric path/to/biometric.csv --replace
+    python ingest.py enrolment                  (uses backend/enrolment_data.csv)
+    python ingest.py enrolment drops/2025-06/    (every *.csv shard in the folder)
+    python ingest.py enrolment "drops/*/enrol_*.csv" --parse-workers 8 --writers 4
+
+Each file is split into byte ranges of roughly --chunk-rows lines. Ranges are
+parsed and normalized in a process pool; a bounded number of writer threads
+(one DB connection each, one shard at a time) COPY and merge them in file
+order, one transaction per chunk. After every commit the byte offset and row
+number are checkpointed next to the CSV, so an interrupted load resumes where
+it stopped (re-running a chunk is harmless: the merge is an upsert). Memory
+use depends on the chunk size and worker counts, not on the file size.
+
+Notes: rows must not contain quoted line breaks (UIDAI exports never do).
+Shards are written concurrently, so they should not share keys (per-state
+drops never do). Finished shards drop their checkpoint and are reloaded if
+the same command is run again.
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import time
+import pandas as pd
+import psycopg2
+from sqlalchemy.exc import SQLAlchemyError
+from bulk_loader import TABLE_SPECS, merge_payload, prepare_table, to_copy_payload
+from database import engine
+import models
+
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS") or "200000")
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS") or "0") or os.cpu_count() or 1
+WRITERS = int(os.getenv("INGEST_WRITERS") or "4")
+
+# Parsed chunks buffered ahead of each writer (bounds memory per shard)
+PARSE_LOOKAHEAD = 2
+
+
+def checkpoint_path(csv_file_path: str, dataset: str):
+    """Checkpoint file kept next to the CSV while a load is in progress"""
+    return f"{csv_file_path}.{dataset}.checkpoint.json"
+
+
+def file_signature(csv_file_path: str):
+    """Size + mtime, so a checkpoint is never applied to a different file"""
+    stat = os.stat(csv_file_path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def read_checkpoint(csv_file_path: str, dataset: str):
+    """Returns the saved checkpoint if it belongs to this exact file, else None"""
+    path = checkpoint_path(csv_file_path, dataset)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠ Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if checkpoint.get("file") != file_signature(csv_file_path):
+        print(f"⚠ Ignoring checkpoint {path}: the CSV changed since it was written")
+        return None
+    return checkpoint
+
+
+def write_checkpoint(csv_file_path: str, dataset: str, checkpoint: dict):
+    """Atomically replaces the checkpoint file"""
+    path = checkpoint_path(csv_file_path, dataset)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def plan_ranges(f, start: int, chunk_rows: int):
+    """
+    Yields (start, end) byte ranges of roughly chunk_rows lines each, aligned
+    to line ends. Line length is estimated from a sample, so planning never
+    reads the whole file.
+    """
+    size = os.fstat(f.fileno()).st_size
+    f.seek(start)
+    sample = f.readlines(1 << 16)
+    avg_line = sum(map(len, sample)) / max(len(sample), 1)
+    chunk_bytes = max(int(avg_line * chunk_rows), 1)
+
+    while start < size:
+        f.seek(min(start + chunk_bytes, size) - 1)
+        f.readline()
+        end = f.tell()
+        yield start, end
+        start = end
+
+
+def parse_range(csv_file_path: str, dataset: str, header: bytes, start, end):
+    """
+    Reads and normalizes one byte range (runs in the parse process pool).
+    Returns (payload, rows, skipped).
+    """
+    with open(csv_file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    chunk = pd.read_csv(io.BytesIO(header + data))
+    payload, skipped = to_copy_payload(dataset, chunk)
+    return payload, len(chunk), skipped
+
+
+def parsed_ranges(csv_file_path, dataset, header, ranges, parse_pool=None):
+    """
+    Yields (payload, rows, skipped, end_offset) in file order.
+    With a pool, up to PARSE_LOOKAHEAD ranges are parsed ahead in parallel.
+    """
+    if parse_pool is None:
+        for start, end in ranges:
+            yield (*parse_range(csv_file_path, dataset, header, start, end), end)
+        return
+
+    pending = deque()
+    for start, end in ranges:
+        pending.append(
+            (
+                parse_pool.submit(
+                    parse_range, csv_file_path, dataset, header, start, end
+                ),
+                end,
+            )
+        )
+        if len(pending) > PARSE_LOOKAHEAD:
+            future, end_offset = pending.popleft()
+            yield (*future.result(), end_offset)
+    while pending:
+        future, end_offset = pending.popleft()
+        yield (*future.result(), end_offset)
+
+
+def ingest_csv(
+    csv_file_path: str,
+    dataset: str,
+    chunk_rows: int = CHUNK_ROWS,
+    resume: bool = True,
+    parse_pool=None,
+    verbose: bool = True,
+):
+    """
+    Upserts one CSV into the dataset's table chunk by chunk, committing and
+    checkpointing after each chunk. The table must already be prepared
+    (see ingest_shards).
+
+    Args:
+        csv_file_path: Path to the CSV file (date in DD-MM-YYYY format)
+        dataset: One of bulk_loader.TABLE_SPECS
+        chunk_rows: Approximate lines per chunk / transaction
+        resume: If True, continue from a matching checkpoint when one exists
+        parse_pool: Optional process pool used to parse chunks ahead of the writer
+        verbose: Print per-chunk progress and a summary
+
+    Returns a stats dict (rows, merged, skipped, seconds) or None on failure.
+    """
+    if not os.path.exists(csv_file_path):
+        print(f"Error: CSV file not found at {csv_file_path}")
+        return None
+
+    checkpoint = read_checkpoint(csv_file_path, dataset) if resume else None
+    if checkpoint:
+        print(
+            f"Resuming {csv_file_path} from row {checkpoint['row_number']:,} "
+            f"(byte {checkpoint['byte_offset']:,})"
+        )
+    else:
+        checkpoint = {
+            "file": file_signature(csv_file_path),
+            "byte_offset": None,
+            "row_number": 0,
+            "merged": 0,
+            "skipped": 0,
+        }
+
+    start_time = time.time()
+    rows_this_run = 0
+    raw_conn = engine.raw_connection()
+    try:
+        with open(csv_file_path, "rb") as f:
+            header = f.readline()
+            if checkpoint["byte_offset"] is None:
+                checkpoint["byte_offset"] = f.tell()
+
+            if verbose:
+                print(f"Reading CSV file: {csv_file_path}")
+            ranges = plan_ranges(f, checkpoint["byte_offset"], chunk_rows)
+            for payload, rows, skipped, end_offset in parsed_ranges(
+                csv_file_path, dataset, header, ranges, parse_pool
+            ):
+                merged = merge_payload(raw_conn, dataset, payload)
+
+                checkpoint["byte_offset"] = end_offset
+                checkpoint["row_number"] += rows
+                checkpoint["merged"] += merged
+                checkpoint["skipped"] += skipped
+                write_checkpoint(csv_file_path, dataset, checkpoint)
+
+                rows_this_run += rows
+                if verbose:
+                    elapsed = time.time() - start_time
+                    print(
+                        f"  ... {checkpoint['row_number']:,} rows committed "
+                        f"({rows_this_run / max(elapsed, 1e-9):,.0f} rows/s)"
+                    )
+
+    except (pd.errors.ParserError, UnicodeDecodeError) as error:
+        print(f"Error reading CSV file {csv_file_path}: {str(error)}")
+        return None
+    except (psycopg2.Error, ValueError, TypeError) as error:
+        print(f"Error during ingestion of {csv_file_path}: {str(error)}")
+        print("  -> Re-run the same command to resume from the last checkpoint.")
+        return None
+    finally:
+        raw_conn.close()
+
+    # Empty / header-only files never write a checkpoint
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(checkpoint_path(csv_file_path, dataset))
+    stats = {
+        "rows": rows_this_run,
+        "merged": checkpoint["merged"],
+        "skipped": checkpoint["skipped"],
+        "seconds": time.time() - start_time,
+    }
+
+    if verbose:
+        print("\n✓ Data population completed successfully!")
+        print(f"  - Records inserted/updated: {stats['merged']}")
+        print(f"  - Records skipped: {stats['skipped']}")
+        print(f"  - Total rows in CSV: {checkpoint['row_number']}")
+        print(
+            f"  - Throughput: {stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s"
+        )
+    return stats
+
+
+def resolve_shards(path: str):
+    """Expands a file, a directory (its *.csv files) or a glob pattern"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.csv")))
+    if glob.has_magic(path):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+def ingest_shards(
+    csv_paths,
+    dataset: str,
+    append_mode: bool = True,
+    chunk_rows: int = CHUNK_ROWS,
+    resume: bool = True,
+    parse_workers: int = PARSE_WORKERS,
+    writers: int = WRITERS,
+):
+    """
+    Loads many CSV shards: parsing fans out over a process pool while at most
+    `writers` shards are merged into the DB at once.
+    Prints per-shard throughput and aggregate totals; returns True if every
+    shard loaded.
+    """
+    if not csv_paths:
+        print("Error: No CSV files matched.")
+        return False
+
+    if not append_mode and any(read_checkpoint(path, dataset) for path in csv_paths):
+        print("⚠ Checkpoints found: resuming instead of clearing the table.")
+        append_mode = True
+
+    # Once, before any writer starts: tables, merge key check and optional TRUNCATE
+    raw_conn = engine.raw_connection()
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        prepare_table(raw_conn, dataset, append_mode=append_mode)
+    except (psycopg2.Error, SQLAlchemyError) as error:
+        print(f"Error preparing {dataset} table: {str(error)}")
+        return False
+    finally:
+        raw_conn.close()
+
+    single = len(csv_paths) == 1
+    start_time = time.time()
+    totals = {"rows": 0, "merged": 0, "skipped": 0}
+    failed = []
+
+    # "spawn": parse workers start lazily, after the writer threads, and a
+    # forked child could inherit a lock one of them holds
+    with ProcessPoolExecutor(
+        max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as parse_pool, ThreadPoolExecutor(
+        max_workers=min(writers, len(csv_paths))
+    ) as writer_pool:
+        futures = {
+            writer_pool.submit(
+                ingest_csv,
+                path,
+                dataset,
+                chunk_rows,
+                resume,
+                parse_pool,
+                single,
+            ): path
+            for path in csv_paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            stats = future.result()
+            if stats is None:
+                failed.append(path)
+                print(f"[{os.path.basename(path)}] ✗ Failed")
+                continue
+            for key in totals:
+                totals[key] += stats[key]
+            if not single:
+                print(
+                    f"[{os.path.basename(path)}] ✓ {stats['rows']:,} rows in "
+                    f"{stats['seconds']:.2f}s "
+                    f"({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s)"
+                )
+
+    if not single:
+        elapsed = time.time() - start_time
+        print("\n" + "=" * 60)
+        print(f"Shards loaded: {len(csv_paths) - len(failed)}/{len(csv_paths)}")
+        print(f"  - Records inserted/updated: {totals['merged']}")
+        print(f"  - Records skipped: {totals['skipped']}")
+        print(f"  - Total rows: {totals['rows']:,} in {elapsed:.2f}s")
+        print(f"  - Throughput: {totals['rows'] / max(elapsed, 1e-9):,.0f} rows/s")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a UIDAI CSV into Postgres.")
+    parser.add_argument(
+        "dataset",
+        choices=list(TABLE_SPECS),
+        help="Which raw table to populate.",
+    )
+    parser.add_argument(
+        "csv_path",
+        nargs="?",
+        help="CSV file, directory of CSV shards or glob pattern "
+        "(default: the dataset's CSV in the backend folder).",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=CHUNK_ROWS,
+        help="Approximate lines per chunk; each chunk is committed and checkpointed.",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help="Processes parsing and normalizing chunks.",
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=WRITERS,
+        help="Shards merged into the database concurrently.",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="Clear the table before loading instead of upserting.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore any checkpoint and load the file from the beginning.",
+    )
+
+    args = parser.parse_args()
+    csv_source = args.csv_path or os.path.join(
+        os.path.dirname(__file__), TABLE_SPECS[args.dataset]["default_csv"]
+    )
+
+    print("=" * 60)
+    print(f"{TABLE_SPECS[args.dataset]['model'].__name__} Ingestion")
+    print("=" * 60)
+    RESULT = ingest_shards(
+        resolve_shards(csv_source),
+        args.dataset,
+        append_mode=not args.replace,
+        chunk_rows=args.chunk_rows,
+        resume=not args.restart,
+        parse_workers=args.parse_workers,
+        writers=args.writers,
+    )
+    if RESULT:
+        print("\n✓ Script completed successfully!")
+    else:
+        print("\n✗ Script encountered errors. Please check the output above.")
@@ -0,0 +1,179 @@
+"""
+Redis-backed queue of detector jobs, run by `worker.py` processes.
+
+A job is identified by "<job name>:<cache generation it replaces>", so every
+API replica missing (or refreshing) the same cached value enqueues the same
+job and it runs once. Workers store the result in the dashboard cache as
+usual (set_cached_data), which also announces it to every API worker.
+
+    jobs:queue               list of job ids (LPUSH / BRPOPLPUSH)
+    jobs:processing:<worker> ids a worker has taken and not finished
+    job:<id>                 hash: name, status, enqueued_at, heartbeat, worker, error
+
+A job whose worker stops heartbeating for JOB_LEASE seconds is put back on
+the queue by the next worker that looks (requeue_stale).
+"""
+
+import asyncio
+import os
+import time
+from redis_client import ASYNC_REDIS_CLIENT, REDIS_CLIENT, blocking_client
+
+QUEUE_KEY = "jobs:queue"
+PROCESSING_PREFIX = "jobs:processing:"
+
+# Seconds without a heartbeat before a running job is considered lost
+JOB_LEASE = int(os.getenv("JOB_LEASE") or "60")
+# Seconds a finished job's record is kept (duplicates within it are no-ops)
+JOB_RECORD_TTL = int(os.getenv("JOB_RECORD_TTL") or "3600")
+JOB_POLL_INTERVAL = 0.25
+# Seconds a worker blocks waiting for a job before checking for stale ones
+JOB_TAKE_TIMEOUT = int(os.getenv("JOB_TAKE_TIMEOUT") or "5")
+
+# take() blocks on its own connections, whose socket timeout outlasts the wait
+BLOCKING_CLIENT = blocking_client(JOB_TAKE_TIMEOUT) if REDIS_CLIENT else None
+
+# Creates and queues the job unless it exists (a failed job may be retried)
+_ENQUEUE = """
+local status = redis.call('hget', KEYS[1], 'status')
+if status and status ~= 'failed' then return 0 end
+redis.call('del', KEYS[1])
+redis.call('hset', KEYS[1], 'name', ARGV[2], 'status', 'queued', 'enqueued_at', ARGV[3])
+redis.call('expire', KEYS[1], ARGV[4])
+redis.call('lpush', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+def job_id(name, generation):
+    """Idempotent id of the job recomputing name past the given generation"""
+    return f"{name}:{generation}"
+
+
+def _job_key(job):
+    return f"job:{job}"
+
+
+def _enqueue_args(name, generation):
+    job = job_id(name, generation)
+    return (
+        _ENQUEUE,
+        2,
+        _job_key(job),
+        QUEUE_KEY,
+        job,
+        name,
+        time.time(),
+        JOB_RECORD_TTL,
+    )
+
+
+def enqueue(name, generation=0):
+    """Queues a job (no-op if already queued, running or done); returns its id"""
+    if not REDIS_CLIENT:
+        raise RuntimeError("The job queue needs Redis")
+    REDIS_CLIENT.eval(*_enqueue_args(name, generation))
+    return job_id(name, generation)
+
+
+async def enqueue_async(name, generation=0):
+    """Non-blocking enqueue"""
+    if not ASYNC_REDIS_CLIENT:
+        raise RuntimeError("The job queue needs Redis")
+    await ASYNC_REDIS_CLIENT.eval(*_enqueue_args(name, generation))
+    return job_id(name, generation)
+
+
+async def wait_for_job_async(job, timeout):
+    """
+    Polls a job until it is done or failed; returns (status, error).
+    status is "timeout" if it is still pending after timeout seconds.
+    """
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while True:
+        status, error = await ASYNC_REDIS_CLIENT.hmget(
+            _job_key(job), ["status", "error"]
+        )
+        status = status.decode() if status else "missing"
+        if status in ("done", "failed", "missing"):
+            return status, error.decode() if error else None
+        if loop.time() >= deadline:
+            return "timeout", None
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+# --- Worker side (blocking client) ---
+def processing_key(worker):
+    """Redis list of the jobs worker has taken and not finished"""
+    return f"{PROCESSING_PREFIX}{worker}"
+
+
+def take(worker, timeout=JOB_TAKE_TIMEOUT):
+    """
+    Next job id for worker (moved to its processing list), or None if none
+    arrives within timeout seconds (at most JOB_TAKE_TIMEOUT)
+    """
+    timeout = min(timeout, JOB_TAKE_TIMEOUT)
+    job = BLOCKING_CLIENT.brpoplpush(QUEUE_KEY, processing_key(worker), timeout)
+    if job is None:
+        return None
+    job = job.decode()
+    now = time.time()
+    REDIS_CLIENT.hset(
+        _job_key(job),
+        mapping={"status": "running", "worker": worker, "heartbeat": now},
+    )
+    return job
+
+
+def job_name(job):
+    """Graph job (e.g. "bot") a queued job id runs"""
+    name = REDIS_CLIENT.hget(_job_key(job), "name")
+    return name.decode() if name else job.rsplit(":", 1)[0]
+
+
+def heartbeat(job):
+    """Marks job alive (and keeps its record from expiring mid-run)"""
+    pipe = REDIS_CLIENT.pipeline(transaction=True)
+    pipe.hset(_job_key(job), "heartbeat", time.time())
+    pipe.expire(_job_key(job), JOB_RECORD_TTL)
+    pipe.execute()
+
+
+def finish(worker, job, error=None):
+    """Records the outcome and removes the job from the worker's list"""
+    pipe = REDIS_CLIENT.pipeline(transaction=True)
+    pipe.hset(
+        _job_key(job),
+        mapping={
+            "status": "failed" if error else "done",
+            "error": error or "",
+            "finished_at": time.time(),
+        },
+    )
+    pipe.expire(_job_key(job), JOB_RECORD_TTL)
+    pipe.lrem(processing_key(worker), 1, job)
+    pipe.execute()
+
+
+def requeue_stale(lease=JOB_LEASE):
+    """Puts jobs of workers that stopped heartbeating back on the queue"""
+    requeued = []
+    now = time.time()
+    for key in REDIS_CLIENT.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+        for raw_id in REDIS_CLIENT.lrange(key, 0, -1):
+            job = raw_id.decode()
+            beat = REDIS_CLIENT.hget(_job_key(job), "heartbeat")
+            if beat is None:
+                # Just taken: give the worker one lease to report in
+                REDIS_CLIENT.hsetnx(_job_key(job), "heartbeat", now)
+                continue
+            if now - float(beat) < lease:
+                continue
+            # Only the reaper that removes it requeues it
+            if REDIS_CLIENT.lrem(key, 1, raw_id):
+                REDIS_CLIENT.hset(_job_key(job), "status", "queued")
+                REDIS_CLIENT.rpush(QUEUE_KEY, raw_id)
+                requeued.append(job)
+    return requeued
@@ -0,0 +1,75 @@
+"""
+In-process LRU in front of Redis for the API.
+
+Entries are stored values (see cache_codec) tagged with the generation they
+were written under; a newer generation announced on the invalidation
+channel (see redis_client.listen_for_invalidations) evicts the older entry
+immediately, and LOCAL_CACHE_TTL bounds staleness if a message is missed.
+Only touched from the event loop, so it takes no locks.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES") or "256")
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES") or str(64 << 20))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL") or "60")
+
+
+class LocalCache:
+    """Size-bounded LRU of key -> (generation, blob) with a TTL per entry"""
+
+    def __init__(
+        self,
+        max_entries=LOCAL_CACHE_MAX_ENTRIES,
+        max_bytes=LOCAL_CACHE_MAX_BYTES,
+        ttl=LOCAL_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (generation, blob, expires_at)
+        self.generations = {}  # key -> newest generation announced
+        self.size = 0
+
+    def get(self, key):
+        """(generation, blob) of a live entry, or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        generation, blob, expires_at = entry
+        if time.monotonic() > expires_at or generation < self.generations.get(key, 0):
+            self._drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return generation, blob
+
+    def put(self, key, generation, blob):
+        """Stores blob unless a newer generation of key is already known"""
+        if generation < self.generations.get(key, 0) or len(blob) > self.max_bytes:
+            return
+        self._drop(key)
+        self.generations[key] = generation
+        self.entries[key] = (generation, blob, time.monotonic() + self.ttl)
+        self.size += len(blob)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+
+    def invalidate(self, key, generation):
+        """Evicts key if its entry is older than generation"""
+        self.generations[key] = max(generation, self.generations.get(key, 0))
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] < generation:
+            self._drop(key)
+
+    def clear(self):
+        """Drops everything (e.g. after missing invalidations)"""
+        self.entries.clear()
+        self.generations.clear()
+        self.size = 0
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
@@ -2,9 +2,15 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import analytics_pool
 import models
 from database import engine
-from api_routes import router as api_router
+from api_routes import (
+    router as api_router,
+    start_invalidation_listener,
+    stop_invalidation_listener,
+)
+from redis_client import close_async_client
 
 # 1. Create DB Tables
 models.Base.metadata.create_all(bind=engine)
@@ -23,9 +29,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Data-Generation"],
 )
 
 # 4. Mount API Routes
 app.include_router(api_router)
 
+# 5. Keep the in-process cache in sync; release Redis connections on shutdown
+app.add_event_handler("startup", start_invalidation_listener)
+app.add_event_handler("shutdown", stop_invalidation_listener)
+app.add_event_handler("shutdown", close_async_client)
+app.add_event_handler("shutdown", analytics_pool.shutdown)
+
 # Run with: uvicorn main:app --reload
@@ -0,0 +1,278 @@
+"""
+Indexed store of the full (geocoded) map anomaly set.
+
+Built by the `map` task and stored on disk, then loaded (memoized) by the API.
+    - Anomalies are kept in score order (highest first); the row position is
+      the anomaly's rank, which is what pagination cursors point at.
+    - Spatial: a longitude-sorted permutation plus Web-Mercator tile x/y
+      precomputed at MAX_ZOOM, so a bbox query is a binary search plus one
+      mask, and clustering at any zoom is a bit shift and a group-by.
+    - Attributes: sorted position lists per type / state / district, so a
+      filtered query only touches the rows its indexed filters select.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import joblib
+
+MAP_INDEX_PATH = os.getenv("MAP_INDEX_PATH") or os.path.join(
+    os.path.dirname(__file__), ".aggregates", "map_index.joblib"
+)
+
+MAX_ZOOM = 20
+# Extra grid bits per map tile: 3 -> 8x8 cells per 256px tile (~32px cells)
+CLUSTER_BITS = int(os.getenv("MAP_CLUSTER_BITS") or "3")
+
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+
+# Anomaly type -> record field used as its score (for ranking and min_score)
+SCORE_FIELDS = {
+    "Phantom Village": "age_18_greater",
+    "Update Mill": "z_score",
+    "Biometric Bypass": "risk_score",
+    "Scholarship Ghost": "demo_age_5_17",
+    "Bot Operator": "round_pct",
+    "Sunday/Holiday Shift": "age_18_greater",
+}
+
+# Whole-number record fields; NaN padding (fields other anomaly types lack)
+# would otherwise turn them into floats
+INTEGER_COLUMNS = [
+    "pincode",
+    "age_18_greater",
+    "demo_age_17_",
+    "demo_age_5_17",
+    "bio_age_5_17",
+]
+
+# Columns with a position index (matched case-insensitively)
+INDEXED_COLUMNS = ["type", "state", "district"]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def tile_coords(lat, lng, zoom=MAX_ZOOM):
+    """Web-Mercator tile x/y (uint32) of each point at the given zoom"""
+    scale = float(1 << zoom)
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lng) + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * scale
+    top = (1 << zoom) - 1
+    return (
+        np.clip(x, 0, top).astype(np.uint32),
+        np.clip(y, 0, top).astype(np.uint32),
+    )
+
+
+def _index_key(value):
+    return str(value).strip().lower()
+
+
+def build_map_index(anomalies):
+    """
+    Builds the store from geocoded anomaly dicts (each with lat, lng, type).
+    Returns {"points", "lng_order", "lng_sorted", "positions", "version"}.
+    """
+    points = pd.DataFrame.from_records(anomalies)
+    for col in ["lat", "lng", "type", "state", "district", "date"]:
+        if col not in points.columns:
+            points[col] = None
+    points = points.astype({"lat": "float64", "lng": "float64"})
+    for col in INTEGER_COLUMNS:
+        if col in points.columns:
+            points[col] = pd.to_numeric(points[col], errors="coerce").astype("Int64")
+
+    # One comparable score per anomaly, taken from its type's own metric
+    score = pd.Series(np.nan, index=points.index)
+    for anomaly_type, field in SCORE_FIELDS.items():
+        if field in points.columns:
+            is_type = points["type"] == anomaly_type
+            score[is_type] = pd.to_numeric(points.loc[is_type, field], errors="coerce")
+    points["score"] = score.fillna(0.0)
+    points["date"] = pd.to_datetime(points["date"], errors="coerce")
+
+    points = points.sort_values("score", ascending=False, kind="stable")
+    points = points.reset_index(drop=True)
+    points["type"] = points["type"].astype("category")
+    points["tile_x"], points["tile_y"] = tile_coords(
+        points["lat"].to_numpy(), points["lng"].to_numpy()
+    )
+
+    lng_order = np.argsort(points["lng"].to_numpy(), kind="stable")
+    positions = {
+        col: {
+            key: np.asarray(rows)
+            for key, rows in points.groupby(
+                points[col].map(_index_key, na_action="ignore"), observed=True
+            ).indices.items()
+        }
+        for col in INDEXED_COLUMNS
+    }
+    return {
+        "points": points,
+        "lng_order": lng_order,
+        "lng_sorted": points["lng"].to_numpy()[lng_order],
+        "positions": positions,
+        "version": f"{time.time():.6f}",
+    }
+
+
+def save_map_index(index, path=MAP_INDEX_PATH):
+    """Atomically replaces the stored index"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_map_index(path=MAP_INDEX_PATH):
+    """The stored index (memoized until the file changes), or None"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        index = joblib.load(path)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"⚠ Could not load map index {path}: {e}")
+        return None
+    with _cache_lock:
+        _cache[path] = (mtime, index)
+    return index
+
+
+# --- SPATIAL CLUSTERING ---
+def in_bbox(index, bbox):
+    """Rows inside bbox = (min_lng, min_lat, max_lng, max_lat)"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    start = np.searchsorted(index["lng_sorted"], min_lng, side="left")
+    stop = np.searchsorted(index["lng_sorted"], max_lng, side="right")
+    window = index["points"].iloc[np.sort(index["lng_order"][start:stop])]
+    lat = window["lat"].to_numpy()
+    return window[(lat >= min_lat) & (lat <= max_lat)]
+
+
+def cluster(index, bbox, zoom):
+    """
+    Grid-clusters the anomalies inside bbox for a map zoom level.
+    Each cell reports its point count, counts per anomaly type and the
+    mean position of its points; every anomaly in the bbox is counted.
+    """
+    zoom = max(0, min(int(zoom), MAX_ZOOM - CLUSTER_BITS))
+    shift = np.uint32(MAX_ZOOM - zoom - CLUSTER_BITS)
+    points = in_bbox(index, bbox)
+    if points.empty:
+        return {"zoom": zoom, "total": 0, "cells": []}
+
+    cells = points[["lat", "lng", "type"]].assign(
+        cell_x=points["tile_x"].to_numpy() >> shift,
+        cell_y=points["tile_y"].to_numpy() >> shift,
+    )
+    keys = ["cell_x", "cell_y"]
+    summary = cells.groupby(keys, sort=True).agg(
+        lat=("lat", "mean"), lng=("lng", "mean"), size=("lat", "size")
+    )
+    by_type = cells.groupby(keys + ["type"], observed=True, sort=True).size()
+
+    types = {}
+    for (cell_x, cell_y, anomaly_type), count in by_type.items():
+        types.setdefault((cell_x, cell_y), {})[anomaly_type] = int(count)
+
+    return {
+        "zoom": zoom,
+        "total": int(len(points)),
+        "cells": [
+            {"lat": lat, "lng": lng, "count": size, "types": types[key]}
+            for key, lat, lng, size in zip(
+                summary.index,
+                summary["lat"].round(6).tolist(),
+                summary["lng"].round(6).tolist(),
+                summary["size"].tolist(),
+            )
+        ],
+    }
+
+
+# --- FILTERED PAGINATION ---
+def encode_cursor(index, rank):
+    """Opaque cursor: the rank to resume from, bound to this index version"""
+    payload = json.dumps({"v": index["version"], "r": int(rank)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(index, cursor):
+    """Rank encoded in cursor; ValueError if malformed or from an older index"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        version, rank = payload["v"], int(payload["r"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if version != index["version"]:
+        raise ValueError("Cursor expired: anomalies were refreshed, restart paging")
+    return rank
+
+
+def query(index, filters, cursor=None, limit=100):
+    """
+    One page of anomalies matching filters, highest score first.
+
+    filters: type/state/district (exact, case-insensitive), date_from/date_to
+    (inclusive dates), min_score. Returns {"total", "items", "next_cursor"}.
+    """
+    points = index["points"]
+
+    # Intersect the (sorted) position lists of the indexed filters
+    candidates = None
+    for col in INDEXED_COLUMNS:
+        if filters.get(col) is not None:
+            rows = index["positions"][col].get(_index_key(filters[col]))
+            if rows is None:
+                return {"total": 0, "items": [], "next_cursor": None}
+            candidates = (
+                rows
+                if candidates is None
+                else np.intersect1d(candidates, rows, assume_unique=True)
+            )
+    if candidates is None:
+        candidates = np.arange(len(points))
+
+    # Remaining filters only look at the candidate rows
+    subset = points.iloc[candidates]
+    mask = np.ones(len(subset), dtype=bool)
+    if filters.get("date_from") is not None:
+        mask &= (subset["date"] >= pd.Timestamp(filters["date_from"])).to_numpy()
+    if filters.get("date_to") is not None:
+        mask &= (subset["date"] <= pd.Timestamp(filters["date_to"])).to_numpy()
+    if filters.get("min_score") is not None:
+        mask &= subset["score"].to_numpy() >= filters["min_score"]
+    matches = candidates[mask]
+
+    start = decode_cursor(index, cursor) if cursor else 0
+    after = matches[np.searchsorted(matches, start) :]
+    page = after[:limit]
+
+    items = points.iloc[page].drop(columns=["tile_x", "tile_y"])
+    items["date"] = items["date"].dt.strftime("%Y-%m-%d")
+    items = items.astype(object).where(items.notna(), None)
+    return {
+        "total": int(len(matches)),
+        # Fields of other anomaly types are left out rather than sent as null
+        "items": [
+            {key: value for key, value in record.items() if value is not None}
+            for record in items.to_dict(orient="records")
+        ],
+        "next_cursor": (
+            encode_cursor(index, page[-1] + 1) if len(after) > limit else None
+        ),
+    }
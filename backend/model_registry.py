@@ -0,0 +1,113 @@
+"""
+On-disk registry of fitted ML models, keyed by the version of the data they
+were trained on. Models are written once by the retrain job and loaded
+read-only (and memoized) by every API worker, so all workers score with the
+exact same model.
+"""
+
+import os
+import threading
+import time
+import joblib
+from sqlalchemy import func, select
+import models
+
+MODEL_DIR = os.getenv("MODEL_DIR") or os.path.join(os.path.dirname(__file__), ".models")
+
+# Older versions kept per model name (for rollback / in-flight readers)
+KEEP_VERSIONS = 3
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def data_version(engine, model_class):
+    """
+    Version string for a raw table: its max row id and the latest ingestion
+    change id (both index lookups). Any load, upsert or reload through
+    ingest.py moves it.
+    """
+    table = model_class.__table__
+    change = models.PartitionChange
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        change_id = conn.execute(
+            select(func.coalesce(func.max(change.id), 0)).where(
+                change.table_name == table.name
+            )
+        ).scalar()
+    return f"{max_id}-{change_id}"
+
+
+def _model_path(name, version):
+    return os.path.join(MODEL_DIR, f"{name}@{version}.joblib")
+
+
+def _latest_path(name):
+    return os.path.join(MODEL_DIR, f"{name}.latest")
+
+
+def save_model(name, version, model, meta=None):
+    """Stores a fitted model for a data version and marks it as latest"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = _model_path(name, version)
+    entry = {
+        "model": model,
+        "version": version,
+        "trained_at": time.time(),
+        "meta": meta or {},
+    }
+    tmp_path = f"{path}.tmp"
+    joblib.dump(entry, tmp_path)
+    os.replace(tmp_path, path)
+
+    with open(f"{_latest_path(name)}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(f"{_latest_path(name)}.tmp", _latest_path(name))
+
+    # Drop the oldest versions beyond KEEP_VERSIONS
+    prefix = f"{name}@"
+    versions = sorted(
+        (
+            os.path.join(MODEL_DIR, file)
+            for file in os.listdir(MODEL_DIR)
+            if file.startswith(prefix) and file.endswith(".joblib")
+        ),
+        key=os.path.getmtime,
+    )
+    for old_path in versions[:-KEEP_VERSIONS]:
+        os.remove(old_path)
+    return entry
+
+
+def load_model(name, version=None):
+    """
+    Returns the stored entry ({"model", "version", "trained_at", "meta"}) for a
+    data version, or the latest one when version is None. None if missing.
+    Entries are memoized per file, so repeated calls do not touch the disk.
+    """
+    if version is None:
+        try:
+            with open(_latest_path(name), encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+
+    path = _model_path(name, version)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        entry = joblib.load(path)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"⚠ Could not load model {path}: {e}")
+        return None
+    with _cache_lock:
+        _cache[path] = (mtime, entry)
+    return entry
@@ -1,7 +1,18 @@
 """SQLAlchemy data models for UIDAI Sentinel database schema"""
 
 import enum
-from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, JSON, Index, text
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    String,
+    Date,
+    DateTime,
+    Enum,
+    JSON,
+    Index,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -49,7 +60,18 @@ class EnrolmentData(Base):
     age_18_greater = Column(Integer, default=0)
 
     # Composite Index for faster Time-Series + Location queries
-    __table_args__ = (Index("idx_enrol_pin_date", "pincode", "date"),)
+    __table_args__ = (
+        Index("idx_enrol_pin_date", "pincode", "date"),
+        # Unique key used by the bulk loader's INSERT ... ON CONFLICT merge
+        Index(
+            "uq_enrolment_data_loc_date",
+            "date",
+            "state",
+            "district",
+            "pincode",
+            unique=True,
+        ),
+    )
 
 
 class DemographicData(Base):
@@ -66,7 +88,17 @@ class DemographicData(Base):
     # The Metrics
     demo_age_5_17 = Column(Integer, default=0)
     demo_age_17_ = Column(Integer, default=0)
-    __table_args__ = (Index("idx_demo_pin_date", "pincode", "date"),)
+    __table_args__ = (
+        Index("idx_demo_pin_date", "pincode", "date"),
+        Index(
+            "uq_demographic_data_loc_date",
+            "date",
+            "state",
+            "district",
+            "pincode",
+            unique=True,
+        ),
+    )
 
 
 class BiometricData(Base):
@@ -84,7 +116,42 @@ class BiometricData(Base):
     bio_age_5_17 = Column(Integer, default=0)
     bio_age_17_ = Column(Integer, default=0)
 
-    __table_args__ = (Index("idx_bio_pin_date", "pincode", "date"),)
+    __table_args__ = (
+        Index("idx_bio_pin_date", "pincode", "date"),
+        Index(
+            "uq_biometric_data_loc_date",
+            "date",
+            "state",
+            "district",
+            "pincode",
+            unique=True,
+        ),
+    )
+
+
+class PartitionChange(Base):
+    """Raw-data partitions touched by ingestion, consumed by incremental detectors"""
+
+    __tablename__ = "partition_changes"
+
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(String, nullable=False)  # e.g. "enrolment_data"
+    # One partition per row (the other two NULL);
+    # all three NULL = the whole table was reloaded (TRUNCATE)
+    date = Column(Date)
+    district = Column(String)
+    pincode = Column(Integer)
+    changed_at = Column(
+        DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP")
+    )
+    # Inserting transaction: ids are handed out before commit, so consumers
+    # track which transactions they have seen (see incremental.py), not ids
+    xid = Column(
+        BigInteger, server_default=text("(pg_current_xact_id()::text::bigint)")
+    )
+
+    # Consumers scan "everything after my watermark" per table
+    __table_args__ = (Index("idx_changes_table_id", "table_name", "id"),)
 
 
 # --- 2. The Intelligence Layer (Alerts) ---
@@ -117,3 +184,18 @@ class AnomalyLog(Base):
 
     # Status (For the dashboard UI to "Dismiss" or "Investigate" alerts)
     status = Column(String, default="OPEN")  # OPEN, INVESTIGATING, RESOLVED
+
+    # One alert per (type, pincode, day): the upsert key of anomaly_log.py
+    # plus the dashboard's drill-down (location/type over time, open alerts)
+    __table_args__ = (
+        Index(
+            "uq_anomaly_logs_type_pin_date",
+            "anomaly_type",
+            "pincode",
+            "data_date",
+            unique=True,
+        ),
+        Index("idx_anomaly_logs_loc_date", "state", "district", "data_date"),
+        Index("idx_anomaly_logs_type_date", "anomaly_type", "data_date"),
+        Index("idx_anomaly_logs_status_severity", "status", "severity"),
+    )
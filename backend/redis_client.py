@@ -1,9 +1,16 @@
 """Redis client setup and utility functions"""
 
+import asyncio
 import os
-import json
+import time
+import uuid
 import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 from dotenv import load_dotenv
+import cache_codec
 
 load_dotenv()
 
@@ -13,36 +20,316 @@ REDIS_HOST = os.getenv("REDIS_HOST") or "localhost"
 REDIS_PORT = int(os.getenv("REDIS_PORT") or "6379")
 REDIS_DB = int(os.getenv("REDIS_DB") or "0")
 
+# Connection pool / timeouts / retry policy (seconds)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS") or "50")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT") or "2")
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT") or "1")
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES") or "2")
+REDIS_BACKOFF_BASE = float(os.getenv("REDIS_BACKOFF_BASE") or "0.05")
+REDIS_BACKOFF_CAP = float(os.getenv("REDIS_BACKOFF_CAP") or "0.5")
+
+# Entries older than the soft TTL are still served (stale) while one worker
+# recomputes them; the Redis expiry (expire_seconds) is the hard limit.
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL") or "3600")
+# Upper bound on one recomputation holding the single-flight lock
+CACHE_LOCK_TTL = int(os.getenv("CACHE_LOCK_TTL") or "600")
+
+# Writers announce "<key> <generation>" here after storing a new value
+CACHE_INVALIDATE_CHANNEL = (
+    os.getenv("CACHE_INVALIDATE_CHANNEL") or "dashboard:invalidate"
+)
+
+# Deletes / extends the lock only if we still own it
+_RELEASE_LOCK = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+_RENEW_LOCK = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+CONNECTION_OPTIONS = {
+    "host": REDIS_HOST,
+    "port": REDIS_PORT,
+    "db": REDIS_DB,
+    # Values are binary (see cache_codec), so responses stay bytes
+    "decode_responses": False,
+    "max_connections": REDIS_MAX_CONNECTIONS,
+    "socket_timeout": REDIS_SOCKET_TIMEOUT,
+    "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+    "retry_on_timeout": True,
+}
+
+
+def _backoff():
+    return ExponentialBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE)
+
+
 try:
+    # Used by the task runner and other blocking callers
     REDIS_CLIENT = redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        decode_responses=True,  # Automatically decode bytes to strings
+        connection_pool=redis.ConnectionPool(
+            retry=Retry(_backoff(), REDIS_RETRIES), **CONNECTION_OPTIONS
+        )
     )
     # Quick connectivity check (optional, can be removed for prod)
     REDIS_CLIENT.ping()
-except redis.ConnectionError as e:
+    # Used by the API: awaits instead of blocking the event loop. Connections
+    # are opened lazily, on the loop of the first request.
+    ASYNC_REDIS_CLIENT = redis.asyncio.Redis(
+        connection_pool=redis.asyncio.ConnectionPool(
+            retry=AsyncRetry(_backoff(), REDIS_RETRIES), **CONNECTION_OPTIONS
+        )
+    )
+except redis.RedisError as e:
     print(f"⚠ Warning: Could not connect to Redis at {REDIS_HOST}:{REDIS_PORT}: {e}")
     REDIS_CLIENT = None
+    ASYNC_REDIS_CLIENT = None
 
 
-def get_cached_data(key: str):
-    """Retrieve JSON data from Redis"""
+def blocking_client(block_seconds: float):
+    """
+    Sync client for blocking commands (e.g. BRPOPLPUSH) that wait up to
+    block_seconds: its socket timeout outlasts the block, so an idle wait
+    returns normally instead of timing out mid-read.
+    """
+    options = {
+        **CONNECTION_OPTIONS,
+        "socket_timeout": block_seconds + REDIS_SOCKET_TIMEOUT,
+    }
+    return redis.Redis(
+        connection_pool=redis.ConnectionPool(
+            retry=Retry(_backoff(), REDIS_RETRIES), **options
+        )
+    )
+
+
+def generation_key(key: str):
+    """Redis key of the counter bumped on every write of key"""
+    return f"{key}:generation"
+
+
+def encode_entry(data, soft_ttl: int = CACHE_SOFT_TTL):
+    """Stored form of data (see cache_codec), fresh for soft_ttl seconds"""
+    return cache_codec.encode(data, time.time() + soft_ttl)
+
+
+def is_stale(blob):
+    """Whether a stored value is past its soft TTL"""
+    header = cache_codec.read_header(blob)
+    if header is None:
+        # Plain JSON written by older versions
+        fresh_until = cache_codec.decode(blob)[1]
+    else:
+        fresh_until = header.fresh_until
+    return fresh_until is not None and time.time() > fresh_until
+
+
+def get_cached_entry(key: str):
+    """
+    Retrieve cached data from Redis as (data, is_stale), or None on a miss.
+    is_stale is True once the entry is past its soft TTL.
+    """
     if not REDIS_CLIENT:
         return None
     try:
-        data = REDIS_CLIENT.get(key)
-        return json.loads(data) if isinstance(data, str) else None
-    except (json.JSONDecodeError, AttributeError) as e:
+        blob = REDIS_CLIENT.get(key)
+        if blob is None:
+            return None
+        data, fresh_until = cache_codec.decode(blob)
+    except (redis.RedisError, ValueError, OSError) as e:
         print(f"Error reading from Redis: {e}")
         return None
+    return data, fresh_until is not None and time.time() > fresh_until
+
+
+def get_cached_data(key: str):
+    """Retrieve JSON data from Redis (stale or not)"""
+    entry = get_cached_entry(key)
+    return entry[0] if entry else None
 
 
-def set_cached_data(key: str, data: dict, expire_seconds: int = 604800):
-    """Store dictionary as JSON in Redis with expiration (Default: 1 week)"""
+def set_cached_data(
+    key: str,
+    data: dict,
+    expire_seconds: int = 604800,
+    soft_ttl: int = CACHE_SOFT_TTL,
+):
+    """
+    Store dictionary in Redis with expiration (Default: 1 week), bump its
+    generation and announce it to API workers. Returns the generation.
+    """
     if REDIS_CLIENT:
         try:
-            REDIS_CLIENT.setex(key, expire_seconds, json.dumps(data))
-        except (redis.RedisError, json.JSONDecodeError, TypeError) as e:
+            pipe = REDIS_CLIENT.pipeline(transaction=True)
+            pipe.setex(key, expire_seconds, encode_entry(data, soft_ttl))
+            pipe.incr(generation_key(key))
+            generation = pipe.execute()[1]
+            REDIS_CLIENT.publish(CACHE_INVALIDATE_CHANNEL, f"{key} {generation}")
+            return generation
+        except (redis.RedisError, TypeError, ValueError) as e:
             print(f"Error writing to Redis: {e}")
+    return None
+
+
+def acquire_lock(key: str, ttl: int = CACHE_LOCK_TTL):
+    """
+    Cross-worker single-flight lock for recomputing a key (SET NX PX).
+    Returns an owner token, None if another worker holds it, or "" when
+    Redis is unavailable (only the caller's local lock applies then).
+    """
+    if not REDIS_CLIENT:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        acquired = REDIS_CLIENT.set(f"lock:{key}", token, nx=True, px=ttl * 1000)
+    except redis.RedisError as e:
+        print(f"Error locking in Redis: {e}")
+        return ""
+    return token if acquired else None
+
+
+def release_lock(key: str, token: str):
+    """Releases a lock taken with acquire_lock (no-op if it expired meanwhile)"""
+    if REDIS_CLIENT and token:
+        try:
+            REDIS_CLIENT.eval(_RELEASE_LOCK, 1, f"lock:{key}", token)
+        except redis.RedisError as e:
+            print(f"Error unlocking in Redis: {e}")
+
+
+def renew_lock(key: str, token: str, ttl: int = CACHE_LOCK_TTL):
+    """Extends a held lock to ttl seconds; False if it is no longer ours"""
+    if not REDIS_CLIENT or not token:
+        return True
+    try:
+        return bool(REDIS_CLIENT.eval(_RENEW_LOCK, 1, f"lock:{key}", token, ttl * 1000))
+    except redis.RedisError as e:
+        print(f"Error renewing lock in Redis: {e}")
+        return False
+
+
+def cache_ttl(key: str):
+    """Seconds until key expires (0 if missing), or None if unknown"""
+    if not REDIS_CLIENT:
+        return None
+    try:
+        ttl = REDIS_CLIENT.ttl(key)
+    except redis.RedisError as e:
+        print(f"Error reading TTL from Redis: {e}")
+        return None
+    # -2: no such key, -1: no expiry
+    return 0 if ttl == -2 else None if ttl == -1 else ttl
+
+
+# --- ASYNC VARIANTS (API event loop) ---
+async def get_cached_blob_async(key: str):
+    """
+    Stored value of key as (generation, blob), undecoded, or None on a miss.
+    """
+    if not ASYNC_REDIS_CLIENT:
+        return None
+    try:
+        pipe = ASYNC_REDIS_CLIENT.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.get(generation_key(key))
+        blob, generation = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error reading from Redis: {e}")
+        return None
+    return None if blob is None else (int(generation or 0), blob)
+
+
+async def get_generation_async(key: str):
+    """Current write generation of key (0 if never written or no Redis)"""
+    if not ASYNC_REDIS_CLIENT:
+        return 0
+    try:
+        return int(await ASYNC_REDIS_CLIENT.get(generation_key(key)) or 0)
+    except redis.RedisError as e:
+        print(f"Error reading from Redis: {e}")
+        return 0
+
+
+async def set_cached_blob_async(key: str, blob: bytes, expire_seconds: int = 604800):
+    """
+    Stores a value made with encode_entry (Default expiry: 1 week) like
+    set_cached_data. Returns its generation (0 without Redis).
+    """
+    if not ASYNC_REDIS_CLIENT:
+        return 0
+    try:
+        pipe = ASYNC_REDIS_CLIENT.pipeline(transaction=True)
+        pipe.setex(key, expire_seconds, blob)
+        pipe.incr(generation_key(key))
+        generation = (await pipe.execute())[1]
+        await ASYNC_REDIS_CLIENT.publish(
+            CACHE_INVALIDATE_CHANNEL, f"{key} {generation}"
+        )
+        return generation
+    except redis.RedisError as e:
+        print(f"Error writing to Redis: {e}")
+        return 0
+
+
+async def acquire_lock_async(key: str, ttl: int = CACHE_LOCK_TTL):
+    """Non-blocking acquire_lock"""
+    if not ASYNC_REDIS_CLIENT:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        acquired = await ASYNC_REDIS_CLIENT.set(
+            f"lock:{key}", token, nx=True, px=ttl * 1000
+        )
+    except redis.RedisError as e:
+        print(f"Error locking in Redis: {e}")
+        return ""
+    return token if acquired else None
+
+
+async def release_lock_async(key: str, token: str):
+    """Non-blocking release_lock"""
+    if ASYNC_REDIS_CLIENT and token:
+        try:
+            await ASYNC_REDIS_CLIENT.eval(_RELEASE_LOCK, 1, f"lock:{key}", token)
+        except redis.RedisError as e:
+            print(f"Error unlocking in Redis: {e}")
+
+
+async def listen_for_invalidations(on_invalidate, on_reset):
+    """
+    Calls on_invalidate(key, generation) for every value written by any
+    process. Runs until cancelled; on_reset() is called whenever the
+    subscription is (re)established, since messages may have been missed.
+    """
+    if not ASYNC_REDIS_CLIENT:
+        return
+    delay = REDIS_BACKOFF_BASE
+    while True:
+        pubsub = ASYNC_REDIS_CLIENT.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATE_CHANNEL)
+            on_reset()
+            delay = REDIS_BACKOFF_BASE
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                try:
+                    key, generation = message["data"].decode().rsplit(" ", 1)
+                    on_invalidate(key, int(generation))
+                except ValueError:
+                    print(f"⚠ Ignoring invalidation message {message['data']!r}")
+        except redis.RedisError as e:
+            print(f"⚠ Cache invalidation listener: {e}; reconnecting")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        finally:
+            await pubsub.aclose()
+
+
+async def close_async_client():
+    """Closes the API's pooled connections (app shutdown)"""
+    if ASYNC_REDIS_CLIENT:
+        await ASYNC_REDIS_CLIENT.aclose(close_connection_pool=True)
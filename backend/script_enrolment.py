@@ -1,220 +0,0 @@
-"""Script to populate enrolment data table from CSV file"""
-
-import os
-import pandas as pd
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import EnrolmentData
-
-
-def populate_enrolment_data(csv_file_path: str, append_mode: bool = True):
-    """
-    Reads a CSV file and populates the EnrolmentData table.
-
-    Args:
-        csv_file_path: Path to the CSV file
-        append_mode: If True, appends new records. If False, replaces all data.
-
-    CSV Columns Expected:
-        - date (DD-MM-YYYY format)
-        - state
-        - district
-        - pincode
-        - age_0_5
-        - age_5_17
-        - age_18_greater
-    """
-
-    if not os.path.exists(csv_file_path):
-        print(f"Error: CSV file not found at {csv_file_path}")
-        return False
-
-    try:
-        # Read CSV file
-        print(f"Reading CSV file: {csv_file_path}")
-        df = pd.read_csv(csv_file_path)
-
-        # Validate required columns
-        required_columns = [
-            "date",
-            "state",
-            "district",
-            "pincode",
-            "age_0_5",
-            "age_5_17",
-            "age_18_greater",
-        ]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-
-        if missing_columns:
-            print(f"Error: Missing columns in CSV: {missing_columns}")
-            return False
-
-        # Convert date column to datetime (handle DD-MM-YYYY format)
-        df["date"] = pd.to_datetime(
-            df["date"], format="%d-%m-%Y", dayfirst=True
-        ).dt.date
-
-        # Create session
-        db: Session = SessionLocal()
-
-        try:
-            # If not in append mode, clear existing data
-            if not append_mode:
-                print("Clearing existing EnrolmentData records...")
-                db.query(EnrolmentData).delete()
-                db.commit()
-
-            # Track statistics
-            inserted = 0
-            skipped = 0
-
-            # Iterate through dataframe rows
-            for index, row in df.iterrows():
-                try:
-                    # Check if record with same date, state, district, pincode exists
-                    existing_record = (
-                        db.query(EnrolmentData)
-                        .filter(
-                            EnrolmentData.date == row["date"],
-                            EnrolmentData.state == row["state"],
-                            EnrolmentData.district == row["district"],
-                            EnrolmentData.pincode == int(row["pincode"]),
-                        )
-                        .first()
-                    )
-
-                    if existing_record and append_mode:
-                        # Update existing record
-                        val_0_5 = int(row["age_0_5"]) if pd.notna(row["age_0_5"]) else 0
-                        val_5_17 = (
-                            int(row["age_5_17"]) if pd.notna(row["age_5_17"]) else 0
-                        )
-                        val_18_greater = (
-                            int(row["age_18_greater"])
-                            if pd.notna(row["age_18_greater"])
-                            else 0
-                        )
-                        existing_record.age_0_5 = val_0_5  # type: ignore
-                        existing_record.age_5_17 = val_5_17  # type: ignore
-                        existing_record.age_18_greater = val_18_greater  # type: ignore
-                        inserted += 1
-                    elif not existing_record:
-                        # Create new record
-                        new_record = EnrolmentData(
-                            date=row["date"],
-                            state=str(row["state"]).strip(),
-                            district=str(row["district"]).strip(),
-                            pincode=int(row["pincode"]),
-                            age_0_5=(
-                                int(row["age_0_5"]) if pd.notna(row["age_0_5"]) else 0
-                            ),
-                            age_5_17=(
-                                int(row["age_5_17"]) if pd.notna(row["age_5_17"]) else 0
-                            ),
-                            age_18_greater=(
-                                int(row["age_18_greater"])
-                                if pd.notna(row["age_18_greater"])
-                                else 0
-                            ),
-                        )
-                        db.add(new_record)
-                        inserted += 1
-                    else:
-                        skipped += 1
-
-                except (
-                    ValueError,
-                    TypeError,
-                    KeyError,
-                ) as e:  # pylint: disable=broad-exception-caught
-                    print(f"Error processing row {index}: {str(e)}")
-                    skipped += 1
-                    continue
-
-            # Commit all changes
-            db.commit()
-
-            print("\n✓ Data population completed successfully!")
-            print(f"  - Records inserted/updated: {inserted}")
-            print(f"  - Records skipped: {skipped}")
-            print(f"  - Total rows in CSV: {len(df)}")
-
-            return True
-
-        except (
-            ValueError,
-            TypeError,
-        ) as error:  # pylint: disable=broad-exception-caught
-            db.rollback()
-            print(f"Error during commit: {str(error)}")
-            return False
-
-        finally:
-            db.close()
-
-    except (
-        FileNotFoundError,
-        pd.errors.ParserError,
-    ) as error:  # pylint: disable=broad-exception-caught
-        print(f"Error reading CSV file: {str(error)}")
-        return False
-
-
-def main():
-    """
-    Main function to run the population script.
-    Place your CSV file in the backend directory and update the path below.
-    """
-
-    # Default CSV file path (place your CSV in the backend folder)
-    csv_path = os.path.join(os.path.dirname(__file__), "enrolment_data.csv")
-
-    # Alternative: You can specify the path directly
-    # csv_path = "c:/path/to/your/file.csv"
-
-    print("=" * 60)
-    print("EnrolmentData Table Population Script")
-    print("=" * 60)
-
-    # Check if CSV exists at default location
-    if not os.path.exists(csv_path):
-        print(f"\nCSV file not found at: {csv_path}")
-        print("\nUsage:")
-        print(
-            "  1. Place your CSV file in the backend directory as 'enrolment_data.csv'"
-        )
-        print(
-            "  2. Ensure CSV has columns: date, state, district, "
-            "pincode, age_0_5, age_5_17, age_18_greater"
-        )
-        print("  3. Run: python script_enrolment.py")
-        print("\nOr pass a custom path:")
-        print("  python script_enrolment.py <path_to_csv>")
-        return
-
-    # Run population in append mode (default)
-    success = populate_enrolment_data(csv_path, append_mode=True)
-
-    if success:
-        print("\n✓ Script completed successfully!")
-    else:
-        print("\n✗ Script encountered errors. Please check the output above.")
-
-
-if __name__ == "__main__":
-    import sys
-
-    # Allow custom CSV path via command line argument
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-        print("=" * 60)
-        print("EnrolmentData Table Population Script")
-        print("=" * 60)
-        RESULT = populate_enrolment_data(csv_file, append_mode=True)
-        if RESULT:
-            print("\n✓ Script completed successfully!")
-        else:
-            print("\n✗ Script encountered errors. Please check the output above.")
-    else:
-        main()
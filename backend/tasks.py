@@ -5,14 +5,36 @@ Usage:
     python tasks.py update
     python tasks.py map
     ...
-    python tasks.py all  (Runs everything sequentially)
+    python tasks.py retrain [--sample-size N] [--n-jobs N] [--force]
+    python tasks.py all [--workers N] [--timeout S] [--retries N]
+        (Runs everything as a dependency graph: detectors in parallel
+        processes, then the map from their results)
+    python tasks.py serve [--poll S] [--workers N] [--timeout S] [--retries N]
+        (Scheduler daemon: refreshes jobs on their interval, after new data is
+        ingested and before cached keys expire; one leader across replicas)
 """
 
+import os
+import random
+import threading
 import time
 import argparse
-from database import SessionLocal
+from sqlalchemy.exc import SQLAlchemyError
+from database import SessionLocal, engine
 import ai_engine
-from redis_client import set_cached_data
+import anomaly_log
+import dag_runner
+import incremental
+import map_index
+import model_registry
+import models
+from redis_client import (
+    acquire_lock,
+    cache_ttl,
+    release_lock,
+    renew_lock,
+    set_cached_data,
+)
 
 # Cache Keys mapping
 KEYS = {
@@ -55,14 +77,36 @@ def run_job(job_name, function, key):
 # --- Individual Job Wrappers ---
 
 
+def task_retrain(sample_size=None, n_jobs=None, force=False):
+    """Fit and store the Phantom Village model for the current data version"""
+    print("[RETRAIN] Starting Phantom Village model training...")
+    start_time = time.time()
+    db = SessionLocal()
+    try:
+        entry = ai_engine.retrain_phantom_model(
+            db,
+            sample_size=(
+                ai_engine.PHANTOM_TRAIN_SAMPLES if sample_size is None else sample_size
+            ),
+            n_jobs=ai_engine.PHANTOM_N_JOBS if n_jobs is None else n_jobs,
+            force=force,
+        )
+        elapsed = time.time() - start_time
+        print(f"[RETRAIN] ✓ Model {entry['version']} ready in {elapsed:.2f}s")
+    except (ValueError, TypeError, KeyError, OSError, RuntimeError) as e:
+        print(f"[RETRAIN] ✗ Failed: {str(e)}")
+    finally:
+        db.close()
+
+
 def task_phantom():
     """Run Phantom Village Analysis Task"""
     run_job("phantom", ai_engine.analyze_phantom_village, KEYS["phantom"])
 
 
 def task_update():
-    """Run Update Mill Analysis Task"""
-    run_job("update", ai_engine.analyze_update_mill, KEYS["update"])
+    """Run Update Mill Analysis Task (incremental: changed districts only)"""
+    run_job("update", incremental.refresh_update_mill, KEYS["update"])
 
 
 def task_bio():
@@ -76,30 +120,311 @@ def task_ghost():
 
 
 def task_bot():
-    """Run Bot Operator Analysis Task"""
-    run_job("bot", ai_engine.analyze_bot_operator, KEYS["bot"])
+    """Run Bot Operator Analysis Task (incremental: changed pincodes only)"""
+    run_job("bot", incremental.refresh_bot_operator, KEYS["bot"])
 
 
 def task_sunday():
-    """Run Sunday Shift Analysis Task"""
-    run_job("sunday", ai_engine.analyze_sunday_shift, KEYS["sunday"])
+    """Run Sunday Shift Analysis Task (incremental: changed dates only)"""
+    run_job("sunday", incremental.refresh_sunday_shift, KEYS["sunday"])
+
+
+def build_map(db):
+    """
+    Rebuilds the spatial map index, upserts every anomaly into anomaly_logs
+    and returns the legacy map sample
+    """
+    return publish_map(db, ai_engine.collect_map_anomalies(db))
+
+
+def publish_map(db, anomalies):
+    """Stores geocoded anomalies (index + anomaly_logs); returns the map sample"""
+    map_index.save_map_index(map_index.build_map_index(anomalies))
+    print(f"[MAP] Spatial index rebuilt with {len(anomalies)} anomalies")
+    try:
+        written = anomaly_log.materialize(db, anomalies)
+        print(f"[MAP] ✓ Upserted {written} alerts into anomaly_logs")
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"[MAP] ✗ Could not write anomaly_logs: {str(e)}")
+    return ai_engine.sample_map_anomalies(anomalies)
 
 
 def task_map():
     """Run Map Anomalies Aggregation Task"""
     # Note: This is the heaviest task as it aggregates multiple models
-    run_job("map", ai_engine.get_all_map_anomalies, KEYS["map"])
+    run_job("map", build_map, KEYS["map"])
+
+
+# --- Dependency graph for `all` ---
+TASK_WORKERS = int(os.getenv("TASK_WORKERS") or "0") or None
+TASK_TIMEOUT = int(os.getenv("TASK_TIMEOUT") or "3600")
+TASK_RETRIES = int(os.getenv("TASK_RETRIES") or "1")
+
 
+def with_session(function):
+    """Graph job calling function(db) on a fresh session"""
 
-def run_all():
-    """Run all analysis tasks sequentially"""
-    task_phantom()
-    task_update()
-    task_bio()
-    task_ghost()
-    task_bot()
-    task_sunday()
-    task_map()
+    def job(_dep_results):
+        db = SessionLocal()
+        try:
+            return function(db)
+        finally:
+            db.close()
+
+    return job
+
+
+def _retrain(db):
+    """Retrain job; only the version goes back to the runner, not the model"""
+    return ai_engine.retrain_phantom_model(db)["version"]
+
+
+def _map_job(dep_results):
+    """Map job: publishes the anomalies of the detector results it depends on"""
+    db = SessionLocal()
+    try:
+        return publish_map(db, ai_engine.map_anomalies_from_results(dep_results))
+    finally:
+        db.close()
+
+
+# Job name -> (function, deps, ordering-only deps); detector names match KEYS
+GRAPH = {
+    "retrain": (with_session(_retrain), (), ()),
+    # Uses the freshly trained model when retrain ran, but can fit its own
+    "phantom": (with_session(ai_engine.analyze_phantom_village), (), ("retrain",)),
+    "update": (with_session(incremental.refresh_update_mill), (), ()),
+    "bio": (with_session(ai_engine.analyze_biometric_bypass), (), ()),
+    "ghost": (with_session(ai_engine.analyze_scholarship_ghost), (), ()),
+    "bot": (with_session(incremental.refresh_bot_operator), (), ()),
+    "sunday": (with_session(incremental.refresh_sunday_shift), (), ()),
+    "map": (_map_job, tuple(ai_engine.DETECTORS), ()),
+}
+
+
+def graph_jobs(timeout=TASK_TIMEOUT, retries=TASK_RETRIES):
+    """GRAPH as dag_runner Jobs; TASK_TIMEOUT_<JOB> overrides one job's timeout"""
+    return {
+        name: dag_runner.Job(
+            function,
+            deps,
+            after,
+            int(os.getenv(f"TASK_TIMEOUT_{name.upper()}") or timeout),
+            retries,
+        )
+        for name, (function, deps, after) in GRAPH.items()
+    }
+
+
+def _drop_inherited_connections():
+    """Child initializer: forgets the parent's pooled connections after fork"""
+    engine.dispose(close=False)
+
+
+def cache_result(name, result):
+    """
+    Caches a finished graph job's output under its dashboard key. Returns
+    the cache generation written, or None if nothing was cached.
+    """
+    if name not in KEYS:
+        return None
+    data_to_cache = result if name == "map" else result.get("chart_data")
+    if not data_to_cache:
+        print(f"[{name.upper()}] ⚠ No data returned.")
+        return None
+    return set_cached_data(KEYS[name], data_to_cache)
+
+
+def run_all(workers=TASK_WORKERS, timeout=TASK_TIMEOUT, retries=TASK_RETRIES):
+    """Run all analysis tasks as a dependency graph and print a summary"""
+    start_time = time.time()
+    outcomes = dag_runner.run_graph(
+        graph_jobs(timeout, retries),
+        max_workers=workers,
+        initializer=_drop_inherited_connections,
+        on_success=cache_result,
+    )
+    print(dag_runner.format_summary(outcomes))
+    print(f"Total: {time.time() - start_time:.2f}s")
+
+
+# --- Scheduler daemon (`serve`) ---
+# Seconds between refreshes of each job (REFRESH_INTERVAL_<JOB> overrides);
+# the map is rebuilt whenever any detector was refreshed
+REFRESH_INTERVALS = {
+    "retrain": 86400,
+    "phantom": 21600,
+    "update": 3600,
+    "bio": 21600,
+    "ghost": 21600,
+    "bot": 3600,
+    "sunday": 3600,
+}
+# Raw tables each job reads: new data in any of them makes the job due
+JOB_TABLES = {
+    "retrain": [models.EnrolmentData],
+    "phantom": [models.EnrolmentData],
+    "update": [models.DemographicData],
+    "bio": [models.DemographicData, models.BiometricData],
+    "ghost": [models.DemographicData, models.BiometricData],
+    "bot": [models.EnrolmentData],
+    "sunday": [models.EnrolmentData],
+}
+SCHEDULER_POLL = int(os.getenv("SCHEDULER_POLL") or "30")
+# Random +/- share of an interval, so jobs due together spread out
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER") or "0.1")
+# Refresh cached keys this many seconds before their (1 week) expiry
+REFRESH_AHEAD = int(os.getenv("REFRESH_AHEAD") or "86400")
+LEADER_LOCK = "scheduler:leader"
+LEADER_TTL = int(os.getenv("SCHEDULER_LEADER_TTL") or "60")
+
+
+def refresh_interval(name):
+    """Seconds between scheduled refreshes of the named job"""
+    return int(os.getenv(f"REFRESH_INTERVAL_{name.upper()}") or REFRESH_INTERVALS[name])
+
+
+def jittered(seconds):
+    """seconds spread by +/- SCHEDULER_JITTER, so replicas do not poll in step"""
+    return seconds * (1 + random.uniform(-SCHEDULER_JITTER, SCHEDULER_JITTER))
+
+
+def table_versions(db):
+    """Current data version of every raw table a job reads"""
+    tables = {table for tables in JOB_TABLES.values() for table in tables}
+    return {
+        table.__tablename__: model_registry.data_version(db.bind, table)
+        for table in tables
+    }
+
+
+def due_jobs(state, versions, now):
+    """Jobs to refresh now, each with the reason"""
+    due = {}
+    for name in REFRESH_INTERVALS:
+        seen = state["versions"].get(name)
+        current = {t.__tablename__: versions[t.__tablename__] for t in JOB_TABLES[name]}
+        ttl = cache_ttl(KEYS[name]) if name in KEYS else None
+        if now >= state["next_run"].get(name, 0):
+            due[name] = "interval"
+        elif seen is not None and seen != current:
+            due[name] = "new data"
+        elif ttl is not None and ttl < REFRESH_AHEAD:
+            due[name] = "expiring" if ttl else "not cached"
+    return due
+
+
+class LeaderLease:
+    """Redis leader lock, renewed from a background thread while held"""
+
+    def __init__(self, ttl=LEADER_TTL):
+        self.ttl = ttl
+        self.token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        """True if this process is (still) the leader"""
+        if self.token is not None:
+            return True
+        token = acquire_lock(LEADER_LOCK, self.ttl)
+        if not token:
+            # None: another replica leads; "": Redis unavailable, and without
+            # the lock every replica would think it leads
+            if token == "":
+                print("[SERVE] ⚠ Redis unavailable, not leading until it is back")
+            return False
+        self.token = token
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+        self._thread.start()
+        return True
+
+    def _renew(self):
+        """Background thread: extends the lock until stopped or lost"""
+        token = self.token
+        while not self._stop.wait(self.ttl / 3):
+            if not renew_lock(LEADER_LOCK, token, self.ttl):
+                print("[SERVE] ⚠ Lost the leader lock")
+                self.token = None
+                return
+
+    def release(self):
+        """Gives up leadership (if held) and stops renewing"""
+        self._stop.set()
+        if self.token is not None:
+            release_lock(LEADER_LOCK, self.token)
+            self.token = None
+
+
+def serve(
+    poll=SCHEDULER_POLL,
+    workers=TASK_WORKERS,
+    timeout=TASK_TIMEOUT,
+    retries=TASK_RETRIES,
+):
+    """
+    Runs forever: every poll seconds the leader refreshes the jobs that are
+    due (interval elapsed, new data ingested, or cached key close to expiry)
+    through the dependency graph, reusing the latest results of the others.
+    """
+    jobs = graph_jobs(timeout, retries)
+    # Latest result / data versions / next interval run of each job
+    state = {"results": {}, "versions": {}, "next_run": {}}
+    lease = LeaderLease()
+    print(f"[SERVE] Scheduler started (poll every {poll}s)")
+    try:
+        while True:
+            if not lease.acquire():
+                time.sleep(jittered(poll))
+                continue
+
+            db = SessionLocal()
+            try:
+                versions = table_versions(db)
+            except SQLAlchemyError as e:
+                print(f"[SERVE] ✗ Could not read data versions: {str(e)}")
+                time.sleep(jittered(poll))
+                continue
+            finally:
+                db.close()
+
+            due = due_jobs(state, versions, time.time())
+            if due:
+                print(
+                    "[SERVE] Refreshing "
+                    + ", ".join(f"{name} ({reason})" for name, reason in due.items())
+                )
+                names = list(due)
+                if any(name in GRAPH["map"][1] for name in names):
+                    names.append("map")
+                outcomes = dag_runner.run_graph(
+                    jobs,
+                    names,
+                    max_workers=workers,
+                    initializer=_drop_inherited_connections,
+                    on_success=cache_result,
+                    results=state["results"],
+                )
+                print(dag_runner.format_summary(outcomes))
+                for name, outcome in outcomes.items():
+                    if name not in REFRESH_INTERVALS:
+                        continue
+                    # Failed jobs are retried after a poll, not a full interval
+                    delay = refresh_interval(name) if outcome.status == "ok" else poll
+                    state["next_run"][name] = time.time() + jittered(delay)
+                    if outcome.status == "ok":
+                        state["results"][name] = outcome.result
+                        state["versions"][name] = {
+                            t.__tablename__: versions[t.__tablename__]
+                            for t in JOB_TABLES[name]
+                        }
+            time.sleep(jittered(poll))
+    except KeyboardInterrupt:
+        print("[SERVE] Stopping")
+    finally:
+        lease.release()
 
 
 if __name__ == "__main__":
@@ -108,13 +433,62 @@ if __name__ == "__main__":
         "job",
         nargs="?",
         default="all",
-        choices=["all", "phantom", "update", "bio", "ghost", "bot", "sunday", "map"],
+        choices=[
+            "all",
+            "serve",
+            "retrain",
+            "phantom",
+            "update",
+            "bio",
+            "ghost",
+            "bot",
+            "sunday",
+            "map",
+        ],
         help="The specific analytics job to run.",
     )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        help="retrain: rows sampled to fit the model (0 = all rows).",
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, help="retrain: parallel jobs for fitting."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="retrain: refit even if the data version already has a model.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=TASK_WORKERS,
+        help="all/serve: jobs run in parallel (default: CPU count).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=TASK_TIMEOUT,
+        help="all/serve: seconds before a job attempt is killed.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=TASK_RETRIES,
+        help="all/serve: extra attempts for a failed or timed out job.",
+    )
+    parser.add_argument(
+        "--poll",
+        type=int,
+        default=SCHEDULER_POLL,
+        help="serve: seconds between scheduling checks.",
+    )
 
     args = parser.parse_args()
 
     job_map = {
+        "retrain": lambda: task_retrain(args.sample_size, args.n_jobs, args.force),
         "phantom": task_phantom,
         "update": task_update,
         "bio": task_bio,
@@ -122,7 +496,8 @@ if __name__ == "__main__":
         "bot": task_bot,
         "sunday": task_sunday,
         "map": task_map,
-        "all": run_all,
+        "all": lambda: run_all(args.workers, args.timeout, args.retries),
+        "serve": lambda: serve(args.poll, args.workers, args.timeout, args.retries),
     }
 
     if args.job in job_map:
@@ -0,0 +1,36 @@
+"""Shared pytest setup: backend modules on sys.path and an in-memory Redis"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py builds its (lazy) engine URL at import; no connection is made
+for name, value in {
+    "DB_USER": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Points redis_client and the job queue at a fresh fakeredis server;
+    returns the sync client
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    # pylint: disable=import-outside-toplevel
+    import job_queue
+    import redis_client
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    async_client = fakeredis.aioredis.FakeRedis(server=server)
+    for module in (redis_client, job_queue):
+        monkeypatch.setattr(module, "REDIS_CLIENT", client)
+        monkeypatch.setattr(module, "ASYNC_REDIS_CLIENT", async_client)
+    monkeypatch.setattr(job_queue, "BLOCKING_CLIENT", client)
+    return client
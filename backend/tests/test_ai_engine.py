@@ -0,0 +1,87 @@
+"""Tests for the typed table loading the detectors run on"""
+
+import pandas as pd
+import ai_engine
+
+
+def raw_frame(**metrics):
+    rows = len(next(iter(metrics.values())))
+    return pd.DataFrame(
+        {
+            "date": [pd.Timestamp("2025-01-06").date()] * rows,
+            "state": ["Karnataka"] * rows,
+            "district": [f"D{i}" for i in range(rows)],
+            "pincode": [560001 + i for i in range(rows)],
+            **metrics,
+        }
+    )
+
+
+def test_compact_dtypes():
+    df = ai_engine.apply_snapshot_dtypes(raw_frame(age_18_greater=[3, 5]))
+    assert str(df["date"].dtype) == "datetime64[ns]"
+    assert isinstance(df["district"].dtype, pd.CategoricalDtype)
+    assert df["pincode"].dtype == "int32"
+    assert df["age_18_greater"].dtype == "int32"
+
+    empty = ai_engine.apply_snapshot_dtypes(pd.DataFrame(columns=df.columns))
+    assert empty["age_18_greater"].dtype == "int32"
+
+
+def test_null_metrics_stay_missing():
+    df = ai_engine.apply_snapshot_dtypes(
+        raw_frame(bio_age_5_17=[None, 2.0], bio_age_17_=[1, 2])
+    )
+    assert df["bio_age_5_17"].isna().tolist() == [True, False]
+    assert df["bio_age_17_"].dtype == "int32"
+
+
+class FrameSnapshot:
+    """DataSnapshot stand-in serving fixed frames"""
+
+    def __init__(self, **frames):
+        self.frames = frames
+        self.engine = None
+
+    def get(self, name):
+        return self.frames[name].copy()
+
+
+def test_ghost_does_not_flag_missing_biometrics():
+    demo = raw_frame(demo_age_5_17=[20, 20], demo_age_17_=[1, 1])
+    bio = raw_frame(bio_age_5_17=[None, 2.0], bio_age_17_=[1, 1])
+    snapshot = FrameSnapshot(
+        demographic=ai_engine.apply_snapshot_dtypes(demo),
+        biometric=ai_engine.apply_snapshot_dtypes(bio),
+    )
+    result = ai_engine.analyze_scholarship_ghost(None, snapshot)
+    assert [row["district"] for row in result["map_data"]] == ["D1"]
+
+
+def test_null_district_reaches_map_data_as_none():
+    demo = raw_frame(demo_age_5_17=[20, 20], demo_age_17_=[1, 1])
+    demo.loc[0, "district"] = None
+    bio = raw_frame(bio_age_5_17=[1, 1], bio_age_17_=[1, 1])
+    bio.loc[0, "district"] = None
+    snapshot = FrameSnapshot(
+        demographic=ai_engine.apply_snapshot_dtypes(demo),
+        biometric=ai_engine.apply_snapshot_dtypes(bio),
+    )
+    result = ai_engine.analyze_scholarship_ghost(None, snapshot)
+    districts = sorted(row["district"] or "" for row in result["map_data"])
+    assert districts == ["", "D1"]
+    assert any(row["district"] is None for row in result["map_data"])
+
+
+def test_concat_keeps_categoricals_with_different_categories():
+    first = ai_engine.apply_snapshot_dtypes(raw_frame(age_0_5=[1, 2]))
+    second = ai_engine.apply_snapshot_dtypes(raw_frame(age_0_5=[3, 4, 5]))
+    second["state"] = "Kerala"
+
+    merged = ai_engine.concat_typed([first, second])
+
+    assert isinstance(merged["state"].dtype, pd.CategoricalDtype)
+    assert isinstance(merged["district"].dtype, pd.CategoricalDtype)
+    assert list(merged["state"]) == ["Karnataka"] * 2 + ["Kerala"] * 3
+    assert list(merged["district"]) == ["D0", "D1", "D0", "D1", "D2"]
+    assert merged["age_0_5"].dtype == ai_engine.METRIC_DTYPE
@@ -0,0 +1,47 @@
+"""Tests for turning map anomalies into anomaly_logs rows"""
+
+import datetime
+import anomaly_log
+from models import AnomalyType, SeverityLevel
+
+
+def test_alert_rows_dedupe_and_grade():
+    anomalies = [
+        {"type": "Update Mill", "pincode": 560001, "date": "2025-01-06", "z_score": 4},
+        {"type": "Update Mill", "pincode": 560001, "date": "2025-01-06", "z_score": 12},
+        {"type": "Bot Operator", "pincode": 560002, "date": "2025-01-07"},
+        {"type": "Unknown", "pincode": 560003, "date": "2025-01-07"},
+        {"type": "Update Mill", "pincode": None, "date": "2025-01-07", "z_score": 9},
+    ]
+    rows = anomaly_log.alert_rows(anomalies)
+    assert [(row["anomaly_type"], row["pincode"]) for row in rows] == [
+        (AnomalyType.UPDATE_MILL, 560001),
+        (AnomalyType.BOT_OPERATOR, 560002),
+    ]
+    mill = rows[0]
+    assert mill["severity"] == SeverityLevel.CRITICAL  # highest score wins
+    assert mill["data_date"] == datetime.date(2025, 1, 6)
+    assert mill["evidence"]["z_score"] == 12
+    assert mill["district"] == "Unknown"
+    assert rows[1]["severity"] == SeverityLevel.LOW
+
+
+def test_no_rows_without_keys():
+    assert not anomaly_log.alert_rows([])
+    assert not anomaly_log.alert_rows([{"type": "Update Mill", "z_score": 3}])
+
+
+def test_missing_location_is_unknown():
+    anomalies = [
+        {
+            "type": "Update Mill",
+            "pincode": 560001,
+            "date": "2025-01-06",
+            "z_score": 4,
+            "district": float("nan"),
+            "state": None,
+        }
+    ]
+    row = anomaly_log.alert_rows(anomalies)[0]
+    assert (row["district"], row["state"]) == ("Unknown", "Unknown")
+    assert "Unknown, Unknown" in row["description"]
@@ -0,0 +1,42 @@
+"""Tests for the cached analytics response paths"""
+
+import asyncio
+import json
+import math
+from starlette.requests import Request
+import api_routes
+
+
+def make_request(headers=()):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/analytics/test",
+            "headers": [(k.encode(), v.encode()) for k, v in headers],
+        }
+    )
+
+
+def test_deadline_fallback_uses_the_cache_codec(monkeypatch):
+    async def not_cached(_key):
+        return None
+
+    async def lock_held(*_args):
+        return False, None
+
+    async def compute(_key, _func):
+        return {"chart_data": [{"state": "Goa", "ratio": math.nan}]}
+
+    monkeypatch.setattr(api_routes, "get_cached", not_cached)
+    monkeypatch.setattr(api_routes, "_recompute", lock_held)
+    monkeypatch.setattr(api_routes, "run_in_pool", compute)
+    monkeypatch.setattr(api_routes, "CACHE_LOCK_WAIT", 0)
+
+    response = asyncio.run(
+        api_routes.compute_locally("dashboard:test", None, make_request(), False)
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('W/"')
+    assert response.headers["Cache-Control"] == api_routes.CACHE_CONTROL
+    assert json.loads(response.body) == [{"state": "Goa", "ratio": None}]
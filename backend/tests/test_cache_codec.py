@@ -0,0 +1,68 @@
+"""Tests for the binary cache format"""
+
+import gzip
+import json
+import math
+import numpy as np
+import pytest
+import cache_codec
+
+DATA = {
+    "chart_data": [{"state": "Goa", "count": 3, "ratio": 0.25}],
+    "map_data": [{"pincode": 403001, "date": "2025-01-06"}],
+}
+CODECS = [
+    (serializer, compression)
+    for serializer in cache_codec.SERIALIZERS
+    for compression in cache_codec.COMPRESSIONS
+]
+
+
+@pytest.mark.parametrize("serializer,compression", CODECS)
+def test_round_trip(serializer, compression):
+    blob = cache_codec.encode(DATA, 123.5, serializer, compression)
+    assert cache_codec.decode(blob) == (DATA, 123.5)
+    header = cache_codec.read_header(blob)
+    assert (header.serializer, header.compression) == (serializer, compression)
+    body, _ = cache_codec.json_body(blob)
+    assert json.loads(body) == DATA
+
+
+def test_digest_depends_on_payload_only():
+    first = cache_codec.encode(DATA, 1.0, "json", "gzip")
+    second = cache_codec.encode(DATA, 2.0, "json", "none")
+    other = cache_codec.encode({"chart_data": []}, 1.0, "json", "gzip")
+    assert cache_codec.digest(first) == cache_codec.digest(second)
+    assert cache_codec.digest(first) != cache_codec.digest(other)
+
+
+def test_gzip_body_passes_through():
+    blob = cache_codec.encode(DATA, 1.0, "json", "gzip")
+    body, encoding = cache_codec.json_body(blob, accept_gzip=True)
+    assert encoding == "gzip"
+    assert json.loads(gzip.decompress(body)) == DATA
+
+
+def test_legacy_plain_json():
+    envelope = json.dumps({"fresh_until": 9.0, "data": DATA}).encode()
+    assert cache_codec.read_header(envelope) is None
+    assert cache_codec.decode(envelope) == (DATA, 9.0)
+    assert cache_codec.decode(json.dumps(DATA).encode()) == (DATA, None)
+
+
+@pytest.mark.parametrize(
+    "serializer",
+    [name for name, spec in cache_codec.SERIALIZERS.items() if spec[3]],
+)
+def test_non_finite_floats_become_null(serializer):
+    data = {"values": [math.nan, 1.5, math.inf, np.float32("nan"), np.int64(2)]}
+    blob = cache_codec.encode(data, 1.0, serializer, "none")
+    body, _ = cache_codec.json_body(blob)
+    assert body == b'{"values":[null,1.5,null,null,2]}'
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(cache_codec.encode(DATA, 1.0, "json", "none"))
+    blob[len(cache_codec.MAGIC)] = 99
+    with pytest.raises(ValueError):
+        cache_codec.read_header(bytes(blob))
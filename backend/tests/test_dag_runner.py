@@ -0,0 +1,82 @@
+"""Tests for the dependency-aware job runner"""
+
+import os
+import time
+import pytest
+from dag_runner import Job, run_graph
+
+
+def quiet(_message):
+    pass
+
+
+def flaky(marker, failures):
+    """Job failing its first `failures` attempts (counted in a marker file)"""
+
+    def run(_deps):
+        with open(marker, "a", encoding="utf-8") as f:
+            f.write("x")
+        if os.path.getsize(marker) <= failures:
+            raise RuntimeError("flaky")
+        return "ok"
+
+    return run
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_dependencies_receive_results(workers):
+    jobs = {
+        "a": Job(lambda deps: 2, ()),
+        "b": Job(lambda deps: deps["a"] * 10, ("a",)),
+        "c": Job(lambda deps: deps["a"] + deps["b"], ("a", "b")),
+    }
+    outcomes = run_graph(jobs, max_workers=workers, log=quiet)
+    assert list(outcomes) == ["a", "b", "c"]
+    assert outcomes["c"].result == 22
+
+
+def test_failed_attempt_is_retried(tmp_path):
+    marker = tmp_path / "attempts"
+    jobs = {"a": Job(flaky(marker, failures=1), (), retries=1)}
+    outcome = run_graph(jobs, max_workers=1, log=quiet)["a"]
+    assert (outcome.status, outcome.attempts, outcome.result) == ("ok", 2, "ok")
+
+
+def test_failure_skips_dependents(tmp_path):
+    jobs = {
+        "a": Job(flaky(tmp_path / "attempts", failures=5), (), retries=1),
+        "b": Job(lambda deps: "never", ("a",)),
+        "c": Job(lambda deps: "independent", ()),
+    }
+    outcomes = run_graph(jobs, max_workers=2, log=quiet)
+    assert outcomes["a"].status == "failed"
+    assert outcomes["a"].attempts == 2
+    assert outcomes["b"].status == "skipped"
+    assert outcomes["b"].attempts == 0
+    assert outcomes["c"].status == "ok"
+
+
+def test_timed_out_attempt_is_terminated():
+    jobs = {"slow": Job(lambda deps: time.sleep(30), (), timeout=0.5, retries=0)}
+    start = time.monotonic()
+    outcome = run_graph(jobs, max_workers=1, log=quiet)["slow"]
+    assert outcome.status == "failed"
+    assert "timed out" in outcome.error
+    assert time.monotonic() - start < 10
+
+
+def test_kept_results_are_not_rerun():
+    jobs = {
+        "a": Job(lambda deps: pytest.fail("a must not run"), ()),
+        "b": Job(lambda deps: deps["a"] + 1, ("a",)),
+    }
+    outcomes = run_graph(jobs, ["b"], max_workers=0, log=quiet, results={"a": 41})
+    assert list(outcomes) == ["b"]
+    assert outcomes["b"].result == 42
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        run_graph({"a": Job(None, ("b",)), "b": Job(None, ("a",))}, log=quiet)
+    with pytest.raises(ValueError, match="Unknown"):
+        run_graph({"a": Job(None, ("missing",))}, log=quiet)
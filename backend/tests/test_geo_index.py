@@ -0,0 +1,54 @@
+"""Tests for the offline geo index: building, lookups and lazy loading"""
+
+import numpy as np
+import pytest
+import geo_index
+
+
+@pytest.fixture(name="source_csv")
+def fixture_source_csv(tmp_path):
+    path = tmp_path / "pincodes.csv"
+    path.write_text(
+        "pincode,district,statename,latitude,longitude\n"
+        "560001,Bengaluru,Karnataka,12.97,77.59\n"
+        "560002,Bengaluru,Karnataka,12.99,77.61\n"
+        "570001,Mysuru,Karnataka,12.30,76.64\n"
+        "999999,Nowhere,Karnataka,0.0,0.0\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+@pytest.fixture(name="unloaded")
+def fixture_unloaded(monkeypatch, tmp_path):
+    """get_index state reset, pointed at an empty directory"""
+    monkeypatch.setattr(geo_index, "GEO_INDEX_DIR", str(tmp_path / "geo"))
+    monkeypatch.setattr(geo_index, "_index", None)
+    monkeypatch.setattr(geo_index, "_index_failed_at", None)
+    return tmp_path / "geo"
+
+
+def test_lookups(source_csv, tmp_path):
+    geo_index.build_index(source_csv, tmp_path / "geo")
+    index = geo_index.GeoIndex(tmp_path / "geo")
+
+    coords = index.lookup_pincodes([560001, 999999, 42])
+    assert coords[0] == pytest.approx([12.97, 77.59], abs=1e-4)
+    assert np.isnan(coords[1:]).all()
+
+    coords = index.lookup_districts(["KARNATAKA ", "Karnataka"], ["bengaluru", "Ooty"])
+    assert coords[0] == pytest.approx([12.98, 77.60], abs=1e-4)
+    assert np.isnan(coords[1]).all()
+
+
+def test_missing_index_is_retried(unloaded, source_csv, monkeypatch):
+    assert geo_index.get_index() is None
+
+    # built after the first miss: not looked for again until the retry window passes
+    geo_index.build_index(source_csv, unloaded)
+    assert geo_index.get_index() is None
+
+    monkeypatch.setattr(geo_index, "GEO_INDEX_RETRY", 0)
+    index = geo_index.get_index()
+    assert isinstance(index, geo_index.GeoIndex)
+    assert geo_index.get_index() is index
@@ -0,0 +1,77 @@
+"""Tests for the Redis job queue and the worker's job handling"""
+
+import time
+import job_queue
+import redis_client
+import tasks
+import worker
+
+
+def test_take_on_empty_queue_returns_none(fake_redis):
+    start = time.monotonic()
+    assert job_queue.take("w1", timeout=1) is None
+    assert time.monotonic() - start < job_queue.JOB_TAKE_TIMEOUT + 1
+
+
+def test_blocking_client_outlasts_its_block():
+    client = redis_client.blocking_client(job_queue.JOB_TAKE_TIMEOUT)
+    timeout = client.connection_pool.connection_kwargs["socket_timeout"]
+    assert timeout > job_queue.JOB_TAKE_TIMEOUT
+
+
+def test_enqueue_is_idempotent(fake_redis):
+    assert job_queue.enqueue("bot", 3) == "bot:3"
+    assert job_queue.enqueue("bot", 3) == "bot:3"
+    assert fake_redis.llen(job_queue.QUEUE_KEY) == 1
+
+
+def test_take_and_finish(fake_redis):
+    job = job_queue.enqueue("bot", 1)
+    assert job_queue.take("w1", timeout=1) == job
+    assert job_queue.job_name(job) == "bot"
+    assert fake_redis.hget(f"job:{job}", "status") == b"running"
+
+    job_queue.finish("w1", job)
+    assert fake_redis.hget(f"job:{job}", "status") == b"done"
+    assert fake_redis.llen(job_queue.processing_key("w1")) == 0
+    # Done jobs are not queued again
+    job_queue.enqueue("bot", 1)
+    assert fake_redis.llen(job_queue.QUEUE_KEY) == 0
+
+
+def test_failed_job_can_be_enqueued_again(fake_redis):
+    job = job_queue.enqueue("bot", 1)
+    job_queue.take("w1", timeout=1)
+    job_queue.finish("w1", job, error="RuntimeError: boom")
+    job_queue.enqueue("bot", 1)
+    assert fake_redis.lrange(job_queue.QUEUE_KEY, 0, -1) == [job.encode()]
+
+
+def test_requeue_stale(fake_redis):
+    job = job_queue.enqueue("bot", 1)
+    job_queue.take("w1", timeout=1)
+    assert not job_queue.requeue_stale(lease=60)
+
+    fake_redis.hset(f"job:{job}", "heartbeat", time.time() - 120)
+    assert job_queue.requeue_stale(lease=60) == [job]
+    assert fake_redis.lrange(job_queue.QUEUE_KEY, 0, -1) == [job.encode()]
+    assert fake_redis.llen(job_queue.processing_key("w1")) == 0
+
+
+def _run_job(monkeypatch, fake_redis, generation):
+    monkeypatch.setattr(
+        worker, "job_function", lambda name: lambda deps: {"chart_data": [1]}
+    )
+    monkeypatch.setattr(tasks, "set_cached_data", lambda key, data: generation)
+    job = job_queue.enqueue("bot", 1)
+    job_queue.take("w1", timeout=1)
+    worker.run_one("w1", job)
+    return fake_redis.hget(f"job:{job}", "status")
+
+
+def test_run_one_marks_cached_result_done(monkeypatch, fake_redis):
+    assert _run_job(monkeypatch, fake_redis, generation=4) == b"done"
+
+
+def test_run_one_fails_when_result_not_cached(monkeypatch, fake_redis):
+    assert _run_job(monkeypatch, fake_redis, generation=None) == b"failed"
@@ -0,0 +1,37 @@
+"""Tests for the API's in-process LRU"""
+
+from local_cache import LocalCache
+
+
+def test_lru_bounds():
+    cache = LocalCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.put("a", 1, b"1234")
+    cache.put("b", 1, b"1234")
+    assert cache.get("a") == (1, b"1234")  # a is now most recent
+    cache.put("c", 1, b"12")
+    assert cache.get("b") is None
+    cache.put("d", 1, b"1234")  # 4 + 2 + 4 bytes: a is evicted by size
+    assert cache.get("a") is None
+    assert cache.size == 6
+    cache.put("big", 1, b"x" * 11)
+    assert cache.get("big") is None
+
+
+def test_newer_generation_evicts_and_blocks_older_values():
+    cache = LocalCache(ttl=60)
+    cache.put("k", 1, b"old")
+    cache.invalidate("k", 2)
+    assert cache.get("k") is None
+    cache.put("k", 1, b"late write of an old value")
+    assert cache.get("k") is None
+    cache.put("k", 2, b"new")
+    assert cache.get("k") == (2, b"new")
+    cache.invalidate("k", 2)  # same generation keeps the entry
+    assert cache.get("k") == (2, b"new")
+
+
+def test_expired_entries_are_dropped():
+    cache = LocalCache(ttl=-1)
+    cache.put("k", 1, b"v")
+    assert cache.get("k") is None
+    assert cache.size == 0
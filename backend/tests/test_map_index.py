@@ -0,0 +1,83 @@
+"""Tests for the map anomaly index: filtered pagination and clustering"""
+
+import pytest
+import map_index
+
+
+def make_anomalies(count=25):
+    anomalies = []
+    for i in range(count):
+        if i % 2:
+            anomaly = {"type": "Update Mill", "z_score": 2.0 + i, "demo_age_17_": i}
+        else:
+            anomaly = {"type": "Bot Operator", "round_pct": 80.0 + i}
+        anomaly.update(
+            lat=12.0 + i * 0.1,
+            lng=77.0 + i * 0.1,
+            pincode=560000 + i,
+            state="Karnataka",
+            district="Bengaluru" if i < 10 else "Mysuru",
+            date=f"2025-01-{i + 1:02d}",
+        )
+        anomalies.append(anomaly)
+    return anomalies
+
+
+@pytest.fixture(name="index")
+def fixture_index():
+    return map_index.build_map_index(make_anomalies())
+
+
+def test_cursor_pages_cover_all_matches_once(index):
+    seen, cursor = [], None
+    while True:
+        page = map_index.query(index, {}, cursor=cursor, limit=7)
+        seen.extend(item["pincode"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert page["total"] == 25
+    assert sorted(seen) == [560000 + i for i in range(25)]
+    scores = [item["score"] for item in map_index.query(index, {}, limit=25)["items"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_filters(index):
+    page = map_index.query(
+        index,
+        {"type": "update mill", "district": "MYSURU", "date_from": "2025-01-15"},
+        limit=100,
+    )
+    assert page["total"] == 5  # days 15..25, odd rows only
+    assert all(item["type"] == "Update Mill" for item in page["items"])
+    assert map_index.query(index, {"state": "Goa"})["total"] == 0
+
+
+def test_items_keep_integer_fields(index):
+    item = map_index.query(index, {"type": "Update Mill"}, limit=1)["items"][0]
+    assert isinstance(item["pincode"], int)
+    assert isinstance(item["demo_age_17_"], int)
+    assert "round_pct" not in item
+
+
+def test_cursor_from_older_index_is_rejected(index):
+    cursor = map_index.query(index, {}, limit=5)["next_cursor"]
+    rebuilt = map_index.build_map_index(make_anomalies())
+    rebuilt["version"] = f"{index['version']}-new"
+    with pytest.raises(ValueError):
+        map_index.query(rebuilt, {}, cursor=cursor)
+    with pytest.raises(ValueError):
+        map_index.decode_cursor(index, "not-a-cursor")
+
+
+def test_cluster_counts_every_point_in_bbox(index):
+    bbox = (77.0, 12.0, 78.05, 13.05)  # first 11 anomalies
+    for zoom in (0, 6, 12):
+        result = map_index.cluster(index, bbox, zoom)
+        assert result["total"] == 11
+        assert sum(cell["count"] for cell in result["cells"]) == 11
+        assert all(
+            sum(cell["types"].values()) == cell["count"] for cell in result["cells"]
+        )
+    assert len(map_index.cluster(index, bbox, 0)["cells"]) == 1
+    assert map_index.cluster(index, (0, 0, 1, 1), 5)["total"] == 0
@@ -0,0 +1,25 @@
+"""Tests for the `tasks.py serve` leader lease"""
+
+import redis_client
+import tasks
+
+
+def test_only_one_lease_leads(fake_redis):
+    first, second = tasks.LeaderLease(ttl=30), tasks.LeaderLease(ttl=30)
+    try:
+        assert first.acquire()
+        assert first.acquire()  # still the leader
+        assert not second.acquire()
+
+        first.release()
+        assert second.acquire()
+    finally:
+        first.release()
+        second.release()
+
+
+def test_no_leader_without_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "REDIS_CLIENT", None)
+    lease = tasks.LeaderLease(ttl=30)
+    assert not lease.acquire()
+    assert lease.token is None
@@ -0,0 +1,89 @@
+"""
+Detector worker: runs jobs from the Redis job queue (see job_queue.py).
+Start as many as needed, on any machine that reaches the DB and Redis:
+    python worker.py [--name NAME] [--once]
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+import redis
+import dag_runner
+import job_queue
+import tasks
+
+
+def job_function(name):
+    """Callable running the named job on a fresh session"""
+    if name == "map":
+        return tasks.with_session(tasks.build_map)
+    if name not in tasks.GRAPH:
+        raise ValueError(f"Unknown job {name!r}")
+    return tasks.GRAPH[name][0]
+
+
+def run_one(worker, job):
+    """Runs one taken job, heartbeating while it computes"""
+    name = job_queue.job_name(job)
+    print(f"[{name.upper()}] Starting job {job}...")
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(job_queue.JOB_LEASE / 3):
+            try:
+                job_queue.heartbeat(job)
+            except redis.RedisError as e:
+                print(f"⚠ Heartbeat for {job} failed: {e}")
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    error = None
+    try:
+        generation = tasks.cache_result(name, job_function(name)({}))
+        if name in tasks.KEYS and generation is None:
+            # A "done" record would block recomputes until it expires
+            raise RuntimeError("result was not written to the cache")
+        print(f"[{name.upper()}] ✓ Job {job} done")
+    except dag_runner.JOB_ERRORS as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"[{name.upper()}] ✗ Job {job} failed: {error}")
+    finally:
+        stop.set()
+        beater.join()
+    job_queue.finish(worker, job, error)
+
+
+def main():
+    """Takes and runs jobs until interrupted (or after one job with --once)"""
+    parser = argparse.ArgumentParser(description="Run detector jobs from Redis.")
+    parser.add_argument(
+        "--name",
+        default=f"{socket.gethostname()}:{os.getpid()}",
+        help="Worker name (unique per process).",
+    )
+    parser.add_argument("--once", action="store_true", help="Exit after the first job.")
+    args = parser.parse_args()
+
+    if job_queue.REDIS_CLIENT is None:
+        raise SystemExit("✗ The job queue needs Redis")
+    print(f"Worker {args.name} waiting for jobs...")
+    while True:
+        try:
+            for job in job_queue.requeue_stale():
+                print(f"⚠ Requeued {job} (its worker stopped responding)")
+            job = job_queue.take(args.name)
+        except redis.RedisError as e:
+            print(f"⚠ Job queue unavailable: {e}")
+            time.sleep(5)
+            continue
+        if job is None:
+            continue
+        run_one(args.name, job)
+        if args.once:
+            break
+
+
+if __name__ == "__main__":
+    main()